@@ -6,12 +6,17 @@ from flask_mail import Mail
 from flask_babel import Babel, get_locale
 from jinja2 import TemplateNotFound
 from dotenv import load_dotenv 
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 db = SQLAlchemy()
 mail = Mail()
 babel = Babel()
 load_dotenv()
 
+# Nombre de proxys de confiance devant l'application (routeur Heroku : 1) ; l'IP cliente
+# est alors lue dans X-Forwarded-For au lieu de l'adresse du routeur.
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1 if os.getenv('DYNO') else 0))
+
 def select_locale():
     lang = request.args.get('lang', type=str)
     if lang in ['fr', 'en', 'ar']:
@@ -20,6 +25,8 @@ def select_locale():
 
 def create_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
+    if TRUSTED_PROXY_HOPS:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 
     # Configurations générales
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
@@ -39,7 +46,11 @@ def create_app():
     app.config['BABEL_SUPPORTED_LOCALES'] = ['fr', 'en', 'ar']
 
     db.init_app(app)
+    from .history import history
+    history.init_app(app)
     mail.init_app(app)
+    from .mailer import mailer
+    mailer.init_app(app)
     babel.init_app(app, locale_selector=select_locale)
 
     # Setup de Flask-Login
@@ -52,9 +63,24 @@ def create_app():
     from .views import views
     app.register_blueprint(auth, url_prefix='/')
     app.register_blueprint(views, url_prefix='/')
+    from .api import api
+    app.register_blueprint(api)
+    from .jobs import jobs_bp, init_app as init_jobs
+    app.register_blueprint(jobs_bp)
+    init_jobs(app)
     from .chatbot_bot import chatbot_bp
     app.register_blueprint(chatbot_bp, url_prefix='/api')
 
+    # Commandes CLI (flask --app App.wsgi <commande>)
+    from .models import init_db_command
+    app.cli.add_command(init_db_command)
+    from .chatbot_bot import train_chatbot_command
+    app.cli.add_command(train_chatbot_command)
+    from .unifac_params import build_params_command
+    from .unifac_tables import build_tables_command
+    app.cli.add_command(build_params_command)
+    app.cli.add_command(build_tables_command)
+
 
     @app.errorhandler(404)
     def handle_404(error):
@@ -72,10 +98,30 @@ def create_app():
             current_app.logger.warning(f"[404 handler] Template introuvable : {template_path}")
             return render_template("404.html", lang_code=code.lower(), path=request.path), 404
 
-    from .models import Formulaire
+    from . import metrics
+    metrics.init_app(app)
+
+    from .user_cache import user_cache
 
     @login_manager.user_loader
     def load_user(user_id):
-        return Formulaire.query.get(int(user_id))
+        return user_cache.get(int(user_id))
 
     return app
+
+
+def warm_up(app):
+    """
+    Charge l'état partagé en lecture seule avant le fork des workers (gunicorn preload_app) :
+    paramètres UNIFAC, table pré-calculée, index du chatbot et gabarits compilés.
+    Les workers en héritent en copie sur écriture au lieu de le reconstruire chacun.
+    """
+    from .unifac_params import get_store
+    from .unifac_tables import get_table
+    from .chatbot_bot import get_index, CHATBOT_LANGUAGES
+    get_store()
+    get_table()
+    for lang in CHATBOT_LANGUAGES:
+        get_index(lang)
+    for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(name)
@@ -0,0 +1,142 @@
+import hashlib
+import math
+import os
+from functools import wraps
+from flask import Blueprint, request, jsonify, current_app, g
+from flask_login import current_user
+from itsdangerous import URLSafeTimedSerializer as Serializer, BadSignature, SignatureExpired
+from .security import (verify_password, login_throttle, HashingBusy, lockout_minutes_left,
+                       register_failed_login, register_successful_login)
+from . import db
+from .models import Formulaire
+from .history import history
+from .unifac_diffusion import list_available_compounds
+from .unifac_tables import diffusion_lookup
+from .batch import run_points, validate_point
+from .Dic import compound_translations
+
+# --- API JSON versionnée (/api/v1) avec jetons par utilisateur ---#
+# Les jetons sont signés (même mécanisme que les liens de réinitialisation) et liés à
+# l'empreinte du mot de passe : changer de mot de passe révoque les jetons existants.
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+API_TOKEN_SALT = os.environ.get("API_TOKEN_SALT", "api-token-salt")
+API_TOKEN_MAX_AGE = int(os.getenv('API_TOKEN_MAX_AGE', 90 * 24 * 3600))
+
+def _password_version(user):
+    return hashlib.sha256(user.password.encode()).hexdigest()[:16]
+
+def generate_api_token(user):
+    s = Serializer(current_app.config['SECRET_KEY'], salt=API_TOKEN_SALT)
+    return s.dumps({'uid': user.id, 'pv': _password_version(user)})
+
+def verify_api_token(token):
+    s = Serializer(current_app.config['SECRET_KEY'], salt=API_TOKEN_SALT)
+    try:
+        data = s.loads(token, max_age=API_TOKEN_MAX_AGE)
+    except (BadSignature, SignatureExpired):
+        return None
+    user = db.session.get(Formulaire, data.get('uid'))
+    if user is None or not user.is_confirmed or data.get('pv') != _password_version(user):
+        return None
+    return user
+
+def api_token_required(view):
+    """ Authentification par en-tête 'Authorization: Bearer <jeton>' """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        token = header[7:].strip() if header.startswith('Bearer ') else None
+        user = verify_api_token(token) if token else None
+        if user is None:
+            return jsonify({'error': 'Jeton API manquant ou invalide'}), 401
+        g.api_user = user
+        return view(*args, **kwargs)
+    return wrapper
+
+def _persist(user_id, rows):
+    # Enregistrement optionnel dans l'historique, par le tampon d'écriture groupée#
+    history.record_many([dict(user_id=user_id, compound_A=row['compound_A'], compound_B=row['compound_B'],
+                              x_A=row['x_A'], T=row['T'], D_exp=row.get('D_exp'),
+                              D_calc=row['D_calc'], error=row.get('error_pct')) for row in rows])
+
+@api.route('/tokens', methods=['POST'])
+def create_token():
+    """
+    Délivre un jeton API : session déjà ouverte ou identifiants {email, password}.
+    """
+    if current_user.is_authenticated:
+        user = db.session.get(Formulaire, current_user.id)
+    else:
+        data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        email, password = str(data.get('email') or ''), str(data.get('password') or '')
+        # Mêmes protections que la connexion web : débit limité avant la recherche du compte,
+        # blocage temporaire et comptage des échecs partagés (security)
+        if not login_throttle.allow(email, request.remote_addr):
+            return jsonify({'error': 'Trop de tentatives, réessayez plus tard'}), 429
+        user = Formulaire.query.filter_by(email=email).first()
+        if user is None:
+            return jsonify({'error': 'Email ou mot de passe incorrect'}), 401
+        wait_minutes = lockout_minutes_left(user)
+        if wait_minutes is not None:
+            return jsonify({'error': f"Compte temporairement bloqué, réessayez dans {wait_minutes} minute(s)"}), 429
+        try:
+            valid = verify_password(user.password, password)
+        except HashingBusy:
+            return jsonify({'error': 'Service occupé, réessayez'}), 503
+        if not valid:
+            lock_minutes = register_failed_login(user)
+            if lock_minutes:
+                return jsonify({'error': f"Trop de tentatives, compte bloqué {lock_minutes} minutes"}), 429
+            return jsonify({'error': 'Email ou mot de passe incorrect'}), 401
+        register_successful_login(user)
+    if not user.is_confirmed:
+        return jsonify({'error': "Compte non confirmé"}), 403
+    return jsonify({'token': generate_api_token(user), 'expires_in': API_TOKEN_MAX_AGE}), 201
+
+@api.route('/compounds', methods=['GET'])
+@api_token_required
+def compounds():
+    return jsonify({'compounds': [{'name': name, 'translations': compound_translations.get(name, {})}
+                                  for name in list_available_compounds()]})
+
+@api.route('/diffusion', methods=['POST'])
+@api_token_required
+def diffusion():
+    """
+    Calcul unitaire : {compound_A, compound_B, x_A, T, D_exp?, lang?, exact?, persist?}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Corps JSON attendu'}), 400
+    try:
+        compound_A, compound_B, x_A, T, D_exp = validate_point(
+            [data.get('compound_A'), data.get('compound_B'), data.get('x_A'), data.get('T'), data.get('D_exp')],
+            data.get('lang', 'en'), {})
+        D_exp = None if math.isnan(D_exp) else D_exp
+        D_AB, error = diffusion_lookup(compound_A, compound_B, x_A, T, D_exp, exact=bool(data.get('exact')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    row = {'compound_A': compound_A, 'compound_B': compound_B, 'x_A': x_A, 'T': T, 'D_exp': D_exp,
+           'D_calc': D_AB, 'error_pct': error}
+    if data.get('persist'):
+        _persist(g.api_user.id, [row])
+    return jsonify(row)
+
+@api.route('/diffusion/batch', methods=['POST'])
+@api_token_required
+def diffusion_batch():
+    """
+    Calcul en lot : {points: [{compound_A, compound_B, x_A, T, D_exp?}, ...], lang?, persist?}.
+    Les points invalides sont signalés individuellement (status) sans faire échouer le lot.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('points'), list):
+        return jsonify({'error': "Corps JSON attendu avec une liste 'points'"}), 400
+    try:
+        results = run_points(data['points'], data.get('lang', 'en'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('persist'):
+        _persist(g.api_user.id, [row for row in results if row['status'] == 'ok'])
+    return jsonify({'results': results, 'ok': sum(1 for row in results if row['status'] == 'ok')})
@@ -1,10 +1,11 @@
 import re, os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_user, login_required, logout_user, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
+from .security import (hash_password, verify_password, login_throttle, HashingBusy, lockout_minutes_left,
+                       register_failed_login, register_successful_login)
 from .models import Formulaire, db
 from flask_mail import Message
-from . import mail
+from .mailer import mailer
 import secrets
 from datetime import datetime, timedelta
 from flask_babel import get_locale
@@ -64,11 +65,7 @@ def send_reset_email(email, token=None, language='fr'):
         recipients=[email]
     )
     msg.body = bodies.get(lang, bodies['fr'])
-
-    try:
-        mail.send(msg)
-    except Exception as e:
-        print(f"Erreur lors de l'envoi de l'e-mail de réinitialisation : {e}")
+    mailer.send(msg)
         
 # ----------------- Fonctions de validation d'email et de mot de passe ----------------- #
 def is_valid_email(email):
@@ -152,6 +149,9 @@ def login_fr():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+        # Limitation du débit avant la recherche du compte : les e-mails inconnus sont aussi limités
+        if not login_throttle.allow(email, request.remote_addr):
+            return too_many_attempts('fr')
         user = Formulaire.query.filter_by(email=email).first()
 
         if user and not user.is_confirmed:
@@ -183,6 +183,9 @@ def login_en():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+        # Limitation du débit avant la recherche du compte : les e-mails inconnus sont aussi limités
+        if not login_throttle.allow(email, request.remote_addr):
+            return too_many_attempts('en')
         user = Formulaire.query.filter_by(email=email).first()
         if user and not user.is_confirmed:
             flash('Your account is not yet confirmed.', category='error')
@@ -211,6 +214,9 @@ def login_ar():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+        # Limitation du débit avant la recherche du compte : les e-mails inconnus sont aussi limités
+        if not login_throttle.allow(email, request.remote_addr):
+            return too_many_attempts('ar')
         user = Formulaire.query.filter_by(email=email).first()
         if user and not user.is_confirmed:
             flash("لم يتم تأكيد حسابك بعد.", category='error')
@@ -259,16 +265,13 @@ def send_confirmation_email(user_email, confirmation_code):
         'en': f"Hello,\n\nYour account has been successfully created. Please use the following code to confirm your account: {confirmation_code}\n\nThank you for trusting us,\nThe Calc-Diff Team",
         'ar': f"مرحبًا,\n\nتم إنشاء حسابك بنجاح. الرجاء استخدام الرمز التالي لتأكيد حسابك: {confirmation_code}\n\nشكرًا لثقتك بنا،\nفريق Calc-Diff"
     }
-    html_body = render_template('msg.html', code=confirmation_code, lang=locale)
+    html_body = mailer.confirmation_html(confirmation_code, locale)
     msg = Message(subject=subjects.get(locale, subjects['fr']),
                   sender='habassetraore36@gmail.com',
                   recipients=[user_email])
     msg.body = plain_texts.get(locale, plain_texts['fr'])
     msg.html = html_body
-    try:
-        mail.send(msg)
-    except Exception as e:
-        print(f"Erreur lors de l'envoi de l'e-mail de confirmation : {e}")
+    mailer.send(msg)
 
 def generate_confirmation_code():
     return ''.join(secrets.choice('0123456789') for _ in range(6))
@@ -383,7 +386,8 @@ def verify():
 @auth.route('/resend_confirmation_<lang>', methods=['GET'])
 @login_required
 def resend_confirmation(lang):
-    user = current_user
+    # current_user est un instantané en cache : on modifie la ligne réelle
+    user = db.session.get(Formulaire, current_user.id)
     if not user.is_confirmed:
         user.confirmation_code = generate_confirmation_code()
         db.session.commit()
@@ -397,13 +401,20 @@ def resend_confirmation(lang):
     return redirect(url_for(f'auth.confirm_{lang}'))
 
 #........................Limite de Tentatives.................#
-def handle_login(user, password_input, lang='fr'):
-    now = datetime.utcnow()
+def too_many_attempts(lang='fr'):
+    """ Réponse à une tentative refusée par la limitation de débit (partagée entre workers) """
+    if lang == 'en':
+        flash("Too many attempts. Please wait a moment before trying again.", "danger")
+    elif lang == 'ar':
+        flash("عدد كبير من المحاولات. يرجى الانتظار قليلاً قبل المحاولة مرة أخرى.", "danger")
+    else:
+        flash("Trop de tentatives. Patientez un instant avant de réessayer.", "danger")
+    return redirect(url_for(f"auth.login_{lang}"))
 
+def handle_login(user, password_input, lang='fr'):
     # Blocage temporaire
-    if user.lockout_time and now < user.lockout_time:
-        wait_minutes = int((user.lockout_time - now).total_seconds() / 60)
-
+    wait_minutes = lockout_minutes_left(user)
+    if wait_minutes is not None:
         if lang == 'en':
             flash(f"Account temporarily locked. Try again in {wait_minutes} minute(s).", "danger")
         elif lang == 'ar':
@@ -413,25 +424,27 @@ def handle_login(user, password_input, lang='fr'):
 
         return redirect(url_for(f"auth.login_{lang}"))
 
-    # Vérification du mot de passe
-    if check_password_hash(user.password, password_input):
-        user.failed_attempts = 0
-        user.lockout_time = None
-        user.lockout_level = 0
-        db.session.commit()
+    # Vérification du mot de passe (pool de hachage)
+    try:
+        valid = verify_password(user.password, password_input)
+    except HashingBusy:
+        if lang == 'en':
+            flash("Service busy. Please try again.", "warning")
+        elif lang == 'ar':
+            flash("الخدمة مشغولة. يرجى المحاولة مرة أخرى.", "warning")
+        else:
+            flash("Service occupé. Veuillez réessayer.", "warning")
+        return redirect(url_for(f"auth.login_{lang}"))
+
+    if valid:
+        register_successful_login(user)
         login_user(user)
 
         return redirect(url_for(f"views.dashboard_{lang}"))
 
-    # Mot de passe incorrect
-    user.failed_attempts += 1
-    if user.failed_attempts >= 3:
-        user.lockout_level += 1
-        lock_durations = [5, 10, 15]  # en minutes
-        lock_minutes = lock_durations[min(user.lockout_level - 1, len(lock_durations) - 1)]
-        user.lockout_time = now + timedelta(minutes=lock_minutes)
-        user.failed_attempts = 0
-
+    # Mot de passe incorrect : compté dans le magasin partagé, la base n'est écrite qu'au blocage
+    lock_minutes = register_failed_login(user)
+    if lock_minutes:
         if lang == 'en':
             flash(f"Too many attempts. Account locked for {lock_minutes} minutes.", "danger")
         elif lang == 'ar':
@@ -447,7 +460,6 @@ def handle_login(user, password_input, lang='fr'):
         else:
             flash("Mot de passe incorrect. Tentative échouée.", "warning")
 
-    db.session.commit()
     return redirect(url_for(f"auth.login_{lang}"))
 
 # -------------------- Fonction pour le reset password en français -------------------- #
@@ -470,7 +482,7 @@ def reset_password_fr():
                 recipients=[user.email]
             )
             msg.body = f"Bonjour,\n\nCliquez sur le lien suivant pour réinitialiser votre mot de passe : {reset_url}\n\nSi vous n'avez rien demandé, ignorez cet email."
-            mail.send(msg)
+            mailer.send(msg)
 
         flash("Si cet email existe, un lien de réinitialisation a été envoyé.", "info")
         return redirect(url_for('auth.reset_password_fr'))
@@ -501,7 +513,7 @@ def reset_password_token_fr(token):
 
         user = Formulaire.query.filter_by(email=email).first()
         if user:
-            user.password = generate_password_hash(password)
+            user.password = hash_password(password)
             db.session.commit()
             flash("Votre mot de passe a été mis à jour.", "success")
             return redirect(url_for('auth.login_fr'))
@@ -528,7 +540,7 @@ def reset_password_en():
                 recipients=[user.email]
             )
             msg.body = f"Hello,\n\nClick on the following link to reset your password: {reset_url}\n\nIf you did not request this, please ignore this email."
-            mail.send(msg)
+            mailer.send(msg)
 
         flash("If the email exists, a reset link has been sent.", "info")
         return redirect(url_for('auth.reset_password_en'))
@@ -559,7 +571,7 @@ def reset_password_token_en(token):
 
         user = Formulaire.query.filter_by(email=email).first()
         if user:
-            user.password = generate_password_hash(password)
+            user.password = hash_password(password)
             db.session.commit()
             flash("Your password has been updated.", "success")
             return redirect(url_for('auth.login_en'))
@@ -586,7 +598,7 @@ def reset_password_ar():
                 recipients=[user.email]
             )
             msg.body = f"مرحباً،\n\nانقر على الرابط التالي لإعادة تعيين كلمة المرور: {reset_url}\n\nإذا لم تطلب هذا، يرجى تجاهل هذا البريد الإلكتروني."
-            mail.send(msg)
+            mailer.send(msg)
 
         flash("إذا كان هذا البريد الإلكتروني موجودًا، تم إرسال رابط لإعادة تعيين كلمة المرور.", "info")
         return redirect(url_for('auth.reset_password_ar'))
@@ -617,7 +629,7 @@ def reset_password_token_ar(token):
 
         user = Formulaire.query.filter_by(email=email).first()
         if user:
-            user.password = generate_password_hash(password)
+            user.password = hash_password(password)
             db.session.commit()
             flash("تم تحديث كلمة المرور الخاصة بك.", "success")
             return redirect(url_for('auth.login_ar'))
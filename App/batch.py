@@ -0,0 +1,187 @@
+import csv
+import io
+import math
+import numpy as np
+from .unifac_diffusion import unifac_diffusion_batch, is_available_compound
+from .Dic import compound_translations
+from .jobs import job_handler
+from .history import history
+
+# --- Calculs en lot à partir d'un CSV (compound_A, compound_B, x_A, T, D_exp) ---#
+BATCH_COLUMNS = ['compound_A', 'compound_B', 'x_A', 'T', 'D_exp']
+RESULT_COLUMNS = ['line', *BATCH_COLUMNS, 'D_calc', 'error_pct', 'status']
+BATCH_MAX_ROWS = 200000
+
+def _resolve(name, language, cache):
+    # Nom technique (anglais) ou nom affiché dans n'importe quelle langue#
+    if name not in cache:
+        english = name if is_available_compound(name) else None
+        if english is None:
+            for lang in (language, 'fr', 'en', 'ar'):
+                english = next((k for k, v in compound_translations.items() if v.get(lang) == name), None)
+                if english:
+                    break
+        cache[name] = english
+    return cache[name]
+
+def _number(value, field):
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"Valeur non numérique pour {field} : '{value}'")
+
+def validate_point(values, language, names):
+    """
+    Vérifie une ligne [compound_A, compound_B, x_A, T, D_exp] et renvoie les valeurs converties
+    (noms techniques, flottants ; D_exp = nan si absent). Lève ValueError sinon.
+    """
+    if not values[0] or not values[1]:
+        raise ValueError("Composé manquant")
+    if not isinstance(values[0], str) or not isinstance(values[1], str):
+        raise ValueError("Composé inconnu ou traduction non trouvée")
+    compound_A, compound_B = _resolve(values[0], language, names), _resolve(values[1], language, names)
+    if compound_A is None or compound_B is None:
+        raise ValueError("Composé inconnu ou traduction non trouvée")
+    x_A, T = _number(values[2], 'x_A'), _number(values[3], 'T')
+    D_exp = _number(values[4], 'D_exp') if values[4] not in ('', None) else np.nan
+    if not (math.isfinite(x_A) and math.isfinite(T)) or math.isinf(D_exp):
+        raise ValueError("La fraction molaire x1, la température T et D_exp doivent être des nombres finis.")
+    if not 0 < x_A < 1:
+        raise ValueError("La fraction molaire x1 doit être strictement comprise entre 0 et 1.")
+    if T == 0:
+        raise ValueError("La température T ne peut pas être nulle.")
+    if D_exp == 0:
+        raise ValueError("D_exp ne peut pas être zéro pour le calcul de l'erreur")
+    return compound_A, compound_B, x_A, T, D_exp
+
+def compute_points(items, progress=None):
+    """
+    items : liste de (résultat, compound_A, compound_B, x_A, T, D_exp) validés.
+    Regroupe par couple de composés, calcule en vectorisé et complète D_calc, error_pct et status.
+    """
+    by_pair = {}
+    for result, compound_A, compound_B, x_A, T, D_exp in items:
+        by_pair.setdefault((compound_A, compound_B), []).append((result, x_A, T, D_exp))
+    for k, ((compound_A, compound_B), group) in enumerate(by_pair.items()):
+        if progress:
+            progress(k / len(by_pair), f"{len(items)} points, couple {k + 1}/{len(by_pair)}")
+        x_A = np.array([item[1] for item in group])
+        T = np.array([item[2] for item in group])
+        D_exp = np.array([item[3] for item in group])
+        try:
+            _, _, D = unifac_diffusion_batch(compound_A, compound_B, x_A, T)
+        except ValueError as e:
+            for item in group:
+                item[0]['status'] = str(e)
+            continue
+        error = np.abs(D_exp - D) / D_exp * 100
+        for item, d, err in zip(group, D.tolist(), error.tolist()):
+            item[0].update(D_calc=d, error_pct=None if np.isnan(err) else err, status='ok')
+
+def _reader(lines):
+    # Délimiteur ';' (tableurs en français) ou ',' détecté sur la première ligne#
+    first = next(lines, '')
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    rows = csv.reader([first], delimiter=delimiter)
+    header = next(rows, [])
+    columns = [c.strip() for c in header]
+    has_header = all(c in columns for c in BATCH_COLUMNS)
+    positions = [columns.index(c) for c in BATCH_COLUMNS] if has_header else list(range(len(BATCH_COLUMNS)))
+    if not has_header:
+        yield 1, header, positions
+    for line_no, row in enumerate(csv.reader(lines, delimiter=delimiter), start=2):
+        yield line_no, row, positions
+
+def run_batch(lines, language='en', progress=None):
+    """
+    Calcule D pour chaque ligne du CSV (itérable de lignes texte, lu en flux).
+    Les lignes sont regroupées par couple de composés pour passer par le moteur vectorisé ;
+    une ligne invalide est signalée dans sa colonne 'status' sans interrompre le lot.
+    Renvoie la liste des résultats (dicts RESULT_COLUMNS) dans l'ordre du fichier.
+    `progress(fraction, message)` est appelé régulièrement (tâches de fond).
+    """
+    results, valid, names = [], [], {}
+    for line_no, row, positions in _reader(iter(lines)):
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(results) >= BATCH_MAX_ROWS:
+            raise ValueError(f"Fichier trop volumineux (maximum {BATCH_MAX_ROWS} lignes).")
+        if progress and len(results) % 10000 == 0:
+            progress(0.0, f"{len(results)} lignes lues")
+        values = [row[p].strip() if p < len(row) else '' for p in positions]
+        result = dict(zip(BATCH_COLUMNS, values), line=line_no, D_calc=None, error_pct=None, status='')
+        results.append(result)
+        try:
+            valid.append((result, *validate_point(values, language, names)))
+        except ValueError as e:
+            result['status'] = str(e)
+    compute_points(valid, progress)
+    return results
+
+def run_points(points, language='en'):
+    """
+    Même traitement pour une liste de points JSON ({compound_A, compound_B, x_A, T, D_exp}).
+    Chaque résultat reprend les noms techniques des composés pour l'enregistrement éventuel.
+    """
+    if len(points) > BATCH_MAX_ROWS:
+        raise ValueError(f"Trop de points (maximum {BATCH_MAX_ROWS}).")
+    results, valid, names = [], [], {}
+    for index, point in enumerate(points):
+        result = {'index': index, 'D_calc': None, 'error_pct': None, 'status': ''}
+        results.append(result)
+        try:
+            if not isinstance(point, dict):
+                raise ValueError("Point invalide : objet JSON attendu")
+            checked = validate_point([point.get(c) for c in BATCH_COLUMNS], language, names)
+        except ValueError as e:
+            result['status'] = str(e)
+            continue
+        result.update(dict(zip(BATCH_COLUMNS, checked)))
+        valid.append((result, *checked))
+    compute_points(valid)
+    for result in results:
+        if result.get('D_exp') is not None and np.isnan(result['D_exp']):
+            result['D_exp'] = None
+    return results
+
+def record_results(user_id, results, language='en'):
+    """
+    Ajoute les lignes calculées à l'historique par le tampon d'écriture groupée.
+    """
+    names = {}
+    rows = []
+    for row in results:
+        if row['status'] != 'ok':
+            continue
+        _, _, x_A, T, D_exp = validate_point([row[c] for c in BATCH_COLUMNS], language, names)
+        rows.append(dict(user_id=user_id, compound_A=row['compound_A'], compound_B=row['compound_B'], x_A=x_A, T=T,
+                         D_exp=None if np.isnan(D_exp) else D_exp, D_calc=row['D_calc'], error=row['error_pct']))
+    history.record_many(rows)
+    return len(rows)
+
+def results_to_csv(results, chunk_size=1000):
+    """
+    Générateur du CSV de résultats, par blocs de lignes.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=RESULT_COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    for start in range(0, len(results), chunk_size):
+        writer.writerows(results[start:start + chunk_size])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@job_handler('batch_csv')
+def batch_csv_job(job, params):
+    """ Version tâche de fond : lit le CSV déposé dans le répertoire de la tâche """
+    with open(job.input_path, encoding='utf-8-sig', newline='') as f:
+        results = run_batch(f, params.get('lang', 'en'), progress=job.progress)
+    if params.get('persist'):
+        record_results(job.user_id, results, params.get('lang', 'en'))
+    with open(job.output_path('resultats_diffusion.csv'), 'w', encoding='utf-8', newline='') as out:
+        for chunk in results_to_csv(results):
+            out.write(chunk)
+    return 'resultats_diffusion.csv', 'text/csv'
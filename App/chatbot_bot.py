@@ -1,56 +1,297 @@
+import hashlib
+import json
 import os
-import uuid
-from flask import Blueprint, request, jsonify, current_app, render_template
-from chatterbot import ChatBot
-from chatterbot.trainers import ListTrainer, ChatterBotCorpusTrainer
+import shutil
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+import click
+from functools import lru_cache
+from flask import Blueprint, request, jsonify, current_app, render_template
+from .chatbot_index import ChatIndex, store_pairs, tokenize
+from .metrics import registry, register_counter, span
 
-# Blueprint Flask pour le bot
-chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/dialogflow')
+# --- Base de connaissances du bot, entraînée hors ligne ---#
+# `flask train-chatbot` entraîne le bot dans un nouveau répertoire versionné de CHATBOT_DIR puis
+# met à jour le pointeur CURRENT. Les workers ouvrent la version courante en lecture seule, au
+# premier message reçu : leur démarrage ne dépend plus de l'entraînement ni de ChatterBot.
+# Le pointeur est vérifié à chaque accès (un stat) : une nouvelle version est prise en compte
+# sans redémarrage.
+CHATBOT_DIR = os.getenv('CHATBOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'chatbot'))
+CHATBOT_DB_NAME = 'calcbot.sqlite3'
+CHATBOT_KEEP_VERSIONS = 3
+# Recherche des réponses : index TF-IDF par langue, cache LRU des questions récentes et
+# réponse de repli quand aucune question connue n'est assez proche (score cosinus)
+CHATBOT_LANGUAGES = ('fr', 'en', 'ar')
+CHATBOT_MIN_SCORE = float(os.getenv('CHATBOT_MIN_SCORE', 0.3))
+CHATBOT_CACHE_SIZE = int(os.getenv('CHATBOT_CACHE_SIZE', 1024))
+# Exécution des réponses sur un pool dédié et borné : au plus CHATBOT_MAX_PENDING messages en
+# attente ou en cours par worker (au-delà, refus immédiat en 503) et CHATBOT_TIMEOUT secondes
+# d'attente par requête, pour que le chatbot ne monopolise pas les workers des calculs UNIFAC.
+CHATBOT_WORKERS = int(os.getenv('CHATBOT_WORKERS', 2))
+CHATBOT_MAX_PENDING = int(os.getenv('CHATBOT_MAX_PENDING', 8))
+CHATBOT_TIMEOUT = float(os.getenv('CHATBOT_TIMEOUT', 2.0))
+BUSY_ANSWERS = {
+    'fr': "L'assistant est très sollicité, réessaie dans un instant.",
+    'en': "The assistant is busy right now, please try again in a moment.",
+    'ar': "المساعد مشغول حالياً، يرجى المحاولة بعد قليل.",
+}
+FALLBACK_ANSWERS = {
+    'fr': "Je n'ai pas compris ta question. Peux-tu la reformuler ?",
+    'en': "I didn't understand your question. Could you rephrase it?",
+    'ar': "لم أفهم سؤالك. هل يمكنك إعادة صياغته؟",
+}
 
-# Instanciation du ChatBot avec stockage SQLite
-bot = ChatBot(
-    'CalcBot',
-    storage_adapter='chatterbot.storage.SQLStorageAdapter',
-    database_uri='sqlite:///calcbot.sqlite3',
-    logic_adapters=['chatterbot.logic.BestMatch'],
-    preprocessors=['chatterbot.preprocessors.clean_whitespace']
-)
+# Paires question/réponse spécifiques à CALC-DIFF, par langue (question, réponse, question, ...)
+TRAINING_PAIRS = {
+    'fr': [
+        "Bonjour", "Salut ! Comment puis-je t'aider aujourd'hui ?",
+        "Comment calculer UNIFAC ?", "Tu peux utiliser le formulaire sur le Dashboard pour calculer le coefficient de diffusion avec la méthode UNIFAC.",
+        "Où trouver l'historique des calculs ?", "Clique sur l'onglet Historique dans la barre latérale pour accéder à l'historique.",
+        "Comment changer la langue en anglais ?", "Utilise le menu Langues et sélectionne Anglais pour basculer l'interface en English.",
+        "Je reçois une erreur", "Peux-tu préciser le message d'erreur ? Je t'aiderai à le résoudre.",
+    ],
+    'en': [
+        "Hello", "Hi! How can I assist you today?",
+        "How to calculate using UNIFAC?", "Use the form on the Dashboard to compute the diffusion coefficient via the UNIFAC method.",
+        "Where is my calculation history?", "Click on the History tab in the sidebar to view your past calculations.",
+        "How do I switch to French?", "Open the Languages menu and choose Français to switch the interface to French.",
+        "I get an error", "Could you provide the exact error message? I'll help you troubleshoot.",
+    ],
+    'ar': [
+        "مرحبا", "أهلاً! كيف يمكنني مساعدتك اليوم؟",
+        "كيف أحسب باستخدام UNIFAC؟", "استخدم النموذج في لوحة التحكم لحساب معامل الانتشار باستخدام طريقة UNIFAC.",
+        "أين أجد سجل الحسابات؟", "انقر على تبويب السجل في الشريط الجانبي لعرض حساباتك السابقة.",
+        "كيف أغير اللغة إلى الإنجليزية؟", "افتح قائمة اللغات واختر English لتغيير الواجهة إلى اللغة الإنجليزية.",
+        "تلقيت خطأ", "هل يمكنك تزويدي برسالة الخطأ المحددة؟ سأساعدك في حلها."
+    ],
+}
 
-# Entraînement du bot via ListTrainer pour paires spécifiques à CALC-DIFF
-trainer = ListTrainer(bot)
-trainer.train([
-    # Français
-    "Bonjour", "Salut ! Comment puis-je t'aider aujourd'hui ?",
-    "Comment calculer UNIFAC ?", "Tu peux utiliser le formulaire sur le Dashboard pour calculer le coefficient de diffusion avec la méthode UNIFAC.",
-    "Où trouver l'historique des calculs ?", "Clique sur l'onglet Historique dans la barre latérale pour accéder à l'historique.",
-    "Comment changer la langue en anglais ?", "Utilise le menu Langues et sélectionne Anglais pour basculer l'interface en English.",
-    "Je reçois une erreur", "Peux-tu préciser le message d'erreur ? Je t'aiderai à le résoudre.",
-    
-    # English
-    "Hello", "Hi! How can I assist you today?",
-    "How to calculate using UNIFAC?", "Use the form on the Dashboard to compute the diffusion coefficient via the UNIFAC method.",
-    "Where is my calculation history?", "Click on the History tab in the sidebar to view your past calculations.",
-    "How do I switch to French?", "Open the Languages menu and choose Français to switch the interface to French.",
-    "I get an error", "Could you provide the exact error message? I'll help you troubleshoot.",
-    
-    # العربية
-    "مرحبا", "أهلاً! كيف يمكنني مساعدتك اليوم؟",
-    "كيف أحسب باستخدام UNIFAC؟", "استخدم النموذج في لوحة التحكم لحساب معامل الانتشار باستخدام طريقة UNIFAC.",
-    "أين أجد سجل الحسابات؟", "انقر على تبويب السجل في الشريط الجانبي لعرض حساباتك السابقة.",
-    "كيف أغير اللغة إلى الإنجليزية؟", "افتح قائمة اللغات واختر English لتغيير الواجهة إلى اللغة الإنجليزية.",
-    "تلقيت خطأ", "هل يمكنك تزويدي برسالة الخطأ المحددة؟ سأساعدك في حلها."
-])
-
-# Entraînement sur corpus prédéfinis pour anglais
-corpus_trainer = ChatterBotCorpusTrainer(bot)
-corpus_trainer.train(
+# Corpus prédéfinis pour l'anglais
+TRAINING_CORPORA = (
     'chatterbot.corpus.english.greetings',
     'chatterbot.corpus.english.conversations',
     'chatterbot.corpus.english.ai',
-    'chatterbot.corpus.english.botprofile'
+    'chatterbot.corpus.english.botprofile',
 )
 
+# Blueprint Flask pour le bot
+chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/dialogflow')
+
+def _make_bot(database_path, read_only=False):
+    from chatterbot import ChatBot
+    uri = f"sqlite:///file:{database_path}?mode=ro&uri=true" if read_only else f"sqlite:///{database_path}"
+    return ChatBot(
+        'CalcBot',
+        storage_adapter='chatterbot.storage.SQLStorageAdapter',
+        database_uri=uri,
+        read_only=read_only,
+        logic_adapters=['chatterbot.logic.BestMatch'],
+        preprocessors=['chatterbot.preprocessors.clean_whitespace']
+    )
+
+def training_version():
+    """ Version de la base : date d'entraînement et empreinte des données d'entraînement """
+    digest = hashlib.sha256(json.dumps([TRAINING_PAIRS, TRAINING_CORPORA], ensure_ascii=False).encode()).hexdigest()[:8]
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{digest}"
+
+def current_version_dir():
+    """ Répertoire de la version courante (None si le bot n'a jamais été entraîné) """
+    try:
+        with open(os.path.join(CHATBOT_DIR, 'CURRENT'), encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(CHATBOT_DIR, version)
+    return path if os.path.isdir(path) else None
+
+def build_indexes(version_dir):
+    """
+    Construit l'index de chaque langue : paires CALC-DIFF de la langue, plus, pour l'anglais,
+    les paires apprises des corpus ChatterBot. Renvoie le nombre de questions indexées par langue.
+    """
+    pairs = {lang: list(zip(conversation[::2], conversation[1::2])) for lang, conversation in TRAINING_PAIRS.items()}
+    known = {text for conversation in TRAINING_PAIRS.values() for text in conversation}
+    pairs['en'] += [(q, a) for q, a in store_pairs(os.path.join(version_dir, CHATBOT_DB_NAME)) if q not in known]
+    sizes = {}
+    for lang, lang_pairs in pairs.items():
+        index = ChatIndex.build(lang_pairs)
+        index.save(os.path.join(version_dir, f"index_{lang}.npz"))
+        sizes[lang] = len(index)
+    return sizes
+
+def train_store(output_dir=None):
+    """
+    Entraîne le bot dans un nouveau répertoire versionné et le publie comme version courante.
+    """
+    base_dir = output_dir or CHATBOT_DIR
+    version = training_version()
+    tmp_dir = os.path.join(base_dir, f".{version}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    from chatterbot.trainers import ListTrainer, ChatterBotCorpusTrainer
+    bot = _make_bot(os.path.join(tmp_dir, CHATBOT_DB_NAME))
+    for conversation in TRAINING_PAIRS.values():
+        ListTrainer(bot).train(conversation)
+    ChatterBotCorpusTrainer(bot).train(*TRAINING_CORPORA)
+    sizes = build_indexes(tmp_dir)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'pairs': sum(len(c) // 2 for c in TRAINING_PAIRS.values()),
+                   'corpora': list(TRAINING_CORPORA), 'index_sizes': sizes}, f)
+    os.replace(tmp_dir, os.path.join(base_dir, version))
+    # Pointeur remplacé atomiquement : les workers voient l'ancienne ou la nouvelle version#
+    with open(os.path.join(base_dir, 'CURRENT.tmp'), 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(os.path.join(base_dir, 'CURRENT.tmp'), os.path.join(base_dir, 'CURRENT'))
+    old = sorted(d for d in os.listdir(base_dir) if not d.startswith(('.', 'CURRENT')))[:-CHATBOT_KEEP_VERSIONS]
+    for name in old:
+        shutil.rmtree(os.path.join(base_dir, name), ignore_errors=True)
+    return version
+
+_bot = None
+_bot_lock = threading.Lock()
+_indexes = {}
+_NOT_LOADED = object()
+_loaded_pointer = None
+
+def _check_version():
+    # Pointeur CURRENT remplacé (os.replace : nouvel inode) : bot, index et cache rechargés.
+    # Renvoie l'identité de la version courante (clé du cache des réponses)#
+    global _bot, _loaded_pointer
+    try:
+        stat = os.stat(os.path.join(CHATBOT_DIR, 'CURRENT'))
+        pointer = (stat.st_ino, stat.st_mtime_ns)
+    except OSError:
+        pointer = None
+    if pointer != _loaded_pointer:
+        with _bot_lock:
+            if pointer != _loaded_pointer:
+                _bot = None
+                _indexes.clear()
+                _indexed_answer.cache_clear()
+                _loaded_pointer = pointer
+    return pointer
+
+def get_bot():
+    """
+    Bot du processus, ouvert en lecture seule sur la version courante au premier appel.
+    Renvoie None si aucune version entraînée n'est disponible.
+    """
+    global _bot
+    _check_version()
+    bot = _bot
+    if bot is None:
+        with _bot_lock:
+            if _bot is None:
+                version_dir = current_version_dir()
+                if version_dir is None:
+                    return None
+                _bot = _make_bot(os.path.join(version_dir, CHATBOT_DB_NAME), read_only=True)
+            bot = _bot
+    return bot
+
+def get_index(lang):
+    """ Index de la langue pour la version courante (None si absent : ancienne version) """
+    _check_version()
+    index = _indexes.get(lang, _NOT_LOADED)
+    if index is _NOT_LOADED:
+        with _bot_lock:
+            if lang not in _indexes:
+                version_dir = current_version_dir()
+                path = os.path.join(version_dir, f"index_{lang}.npz") if version_dir else None
+                _indexes[lang] = ChatIndex.load(path) if path and os.path.exists(path) else None
+            index = _indexes[lang]
+    return index
+
+@lru_cache(maxsize=CHATBOT_CACHE_SIZE)
+def _indexed_answer(version, lang, normalized):
+    # Clé incluant la version : aucune réponse d'une ancienne version après publication.
+    # None si cette version n'a pas d'index pour la langue#
+    index = get_index(lang)
+    if index is None:
+        return None
+    answer, score = index.query(normalized)
+    return answer if score >= CHATBOT_MIN_SCORE else FALLBACK_ANSWERS[lang]
+
+def answer_message(msg, lang):
+    """
+    Réponse au message dans la langue demandée : index de la langue (avec cache LRU sur la
+    version et la question normalisée), sinon ChatterBot. None si aucune base n'est disponible.
+    """
+    lang = lang if lang in CHATBOT_LANGUAGES else 'fr'
+    answer = _indexed_answer(_check_version(), lang, ' '.join(tokenize(msg)))
+    if answer is not None:
+        return answer
+    bot = get_bot()
+    return str(bot.get_response(msg)) if bot is not None else None
+
+# Charge et événements du chatbot, exposés par /metrics (App/metrics.py)#
+CHATBOT_EVENTS = 'calcdiff_chatbot_events_total'
+register_counter(CHATBOT_EVENTS, "Événements du chatbot : requêtes acceptées, refus (surcharge), délais dépassés, erreurs.")
+_load = {'queued': 0, 'running': 0}
+_load_lock = threading.Lock()
+
+def _add_load(**deltas):
+    with _load_lock:
+        for name, delta in deltas.items():
+            _load[name] += delta
+
+def _count_event(event):
+    registry.count(CHATBOT_EVENTS, (('event', event),))
+
+registry.register_gauge('calcdiff_chatbot_queue_depth', "Questions du chatbot en attente d'un thread.", lambda: _load['queued'])
+registry.register_gauge('calcdiff_chatbot_running', "Questions du chatbot en cours de traitement.", lambda: _load['running'])
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(CHATBOT_MAX_PENDING)
+
+def _get_executor():
+    # Un pool par processus, créé après le fork des workers#
+    global _executor, _executor_pid, _slots
+    if _executor_pid != os.getpid():
+        with _bot_lock:
+            if _executor_pid != os.getpid():
+                _slots = threading.BoundedSemaphore(CHATBOT_MAX_PENDING)
+                _executor = ThreadPoolExecutor(max_workers=CHATBOT_WORKERS, thread_name_prefix='chatbot')
+                _executor_pid = os.getpid()
+    return _executor
+
+def _run_answer(msg, lang):
+    _add_load(queued=-1, running=1)
+    try:
+        with span('chatbot_answer'):
+            return answer_message(msg, lang)
+    finally:
+        _add_load(running=-1)
+
+def _release_slot(future):
+    _slots.release()
+    if not future.cancelled() and future.exception() is not None:
+        _count_event('error')
+
+def submit_answer(msg, lang):
+    """
+    Confie le message au pool du chatbot ; renvoie None si la limite de charge est atteinte.
+    La place n'est libérée qu'à la fin réelle du calcul, même si la requête a abandonné.
+    """
+    executor = _get_executor()
+    if not _slots.acquire(blocking=False):
+        _count_event('shed')
+        return None
+    _add_load(queued=1)
+    _count_event('request')
+    future = executor.submit(_run_answer, msg, lang)
+    future.add_done_callback(_release_slot)
+    return future
+
+@click.command('train-chatbot')
+@click.option('--output', default=None, help="Répertoire des versions (défaut : CHATBOT_DIR ou instance/chatbot).")
+def train_chatbot_command(output):
+    """Entraîne le chatbot et publie une nouvelle version de sa base."""
+    version = train_store(output)
+    click.echo(f"Base du chatbot entraînée : version {version}")
+
 # Route d'affichage du chat intégré (optionnel)
 @chatbot_bp.route('/chat', methods=['GET'])
 def chat_ui():
@@ -69,9 +310,22 @@ def chat_api():
         if not msg:
             return jsonify({'error': 'Message manquant'}), 400
 
-        # Réponse du bot, peut être enrichie selon lang si besoin
-        response = bot.get_response(msg)
-        return jsonify({'response': str(response)}), 200
+        lang = lang if lang in CHATBOT_LANGUAGES else 'fr'
+        future = submit_answer(msg, lang)
+        if future is None:
+            response = jsonify({'response': BUSY_ANSWERS[lang], 'fallback': 'overloaded'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        try:
+            response = future.result(timeout=CHATBOT_TIMEOUT)
+        except FutureTimeout:
+            _count_event('timeout')
+            return jsonify({'response': BUSY_ANSWERS[lang], 'fallback': 'timeout'}), 200
+        if response is None:
+            current_app.logger.warning("[chatbot] Aucune base entraînée : lancer `flask train-chatbot`")
+            return jsonify({'error': 'Assistant indisponible'}), 503
+        return jsonify({'response': response}), 200
 
     except Exception as e:
         current_app.logger.error(f"Erreur dans /dialogflow/chatbot: {e}")
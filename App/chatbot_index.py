@@ -0,0 +1,109 @@
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+import numpy as np
+
+# --- Index de recherche des réponses du chatbot (TF-IDF, index inversé) ---#
+# Construit à l'entraînement (un fichier par langue dans le répertoire de version) à partir des
+# paires question → réponse. Une requête ne parcourt que les listes de documents des mots de la
+# question (format CSR par mot) au lieu de comparer la question à chaque phrase connue.
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    """ Mots en minuscules, sans accents ni signes diacritiques (français, arabe) """
+    text = unicodedata.normalize('NFKD', text.lower())
+    return _TOKEN_RE.findall(''.join(ch for ch in text if not unicodedata.combining(ch)))
+
+def _term_weights(counts, idf):
+    # tf sous-linéaire × idf, normalisé (norme euclidienne)#
+    terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    weights = (1.0 + np.log(np.fromiter(counts.values(), dtype=float, count=len(counts)))) * idf[terms]
+    return terms, weights / np.linalg.norm(weights)
+
+class ChatIndex:
+    """
+    Questions connues d'une langue et leur réponse, indexées par mot.
+    postings_indptr[t]:postings_indptr[t + 1] délimite les documents (et poids) du mot t.
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+        self.vocabulary = {term: k for k, term in enumerate(self.terms.tolist())}
+        self.answer_list = self.answers.tolist()
+
+    @classmethod
+    def build(cls, pairs):
+        """
+        pairs : itérable de (question, réponse). Pour une même question, la réponse la plus
+        fréquente est retenue.
+        """
+        by_question = {}
+        for question, answer in pairs:
+            key = ' '.join(tokenize(question))
+            if key:
+                by_question.setdefault(key, Counter())[answer] += 1
+        questions = list(by_question)
+        answers = [by_question[q].most_common(1)[0][0] for q in questions]
+        vocabulary = {}
+        documents = [Counter(vocabulary.setdefault(t, len(vocabulary)) for t in q.split()) for q in questions]
+        df = np.zeros(len(vocabulary))
+        for counts in documents:
+            df[list(counts)] += 1
+        idf = np.log((1.0 + len(documents)) / (1.0 + df)) + 1.0
+        doc_ids, term_ids, weights = [], [], []
+        for d, counts in enumerate(documents):
+            terms, w = _term_weights(counts, idf)
+            doc_ids.append(np.full(len(terms), d, dtype=np.int32))
+            term_ids.append(terms)
+            weights.append(w)
+        doc_ids = np.concatenate(doc_ids) if documents else np.zeros(0, dtype=np.int32)
+        term_ids = np.concatenate(term_ids) if documents else np.zeros(0, dtype=np.int64)
+        weights = np.concatenate(weights) if documents else np.zeros(0)
+        order = np.argsort(term_ids, kind='stable')
+        return cls({
+            'terms': np.array(list(vocabulary), dtype=str),
+            'idf': idf,
+            'postings_indptr': np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)))]).astype(np.int64),
+            'postings_doc': doc_ids[order],
+            'postings_weight': weights[order].astype(np.float32),
+            'questions': np.array(questions, dtype=str),
+            'answers': np.array(answers, dtype=str),
+        })
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path):
+        np.savez(path, **self.arrays)
+
+    def __len__(self):
+        return len(self.answer_list)
+
+    def query(self, text):
+        """ (réponse, score cosinus) de la question connue la plus proche ; (None, 0.0) si aucun mot connu """
+        counts = Counter(self.vocabulary[t] for t in tokenize(text) if t in self.vocabulary)
+        if not counts:
+            return None, 0.0
+        terms, weights = _term_weights(counts, self.idf)
+        scores = np.zeros(len(self.answer_list))
+        for term, weight in zip(terms.tolist(), weights.tolist()):
+            start, end = self.postings_indptr[term], self.postings_indptr[term + 1]
+            scores[self.postings_doc[start:end]] += weight * self.postings_weight[start:end]
+        best = int(np.argmax(scores))
+        return self.answer_list[best], float(scores[best])
+
+def store_pairs(database_path):
+    """
+    Paires (question, réponse) apprises par ChatterBot dans sa base SQLite (table statement).
+    """
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT in_response_to, text FROM statement WHERE in_response_to IS NOT NULL").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+from . import db
+from .models import Calculation
+from .Dic import compound_translations
+
+# --- Exports de l'historique des calculs (filtres communs, CSV / NDJSON en flux) ---#
+# Les filtres sont appliqués en SQL ; la lecture se fait par curseur côté serveur (stream_results)
+# par blocs de EXPORT_BATCH_ROWS lignes, et la réponse est produite par un générateur :
+# la mémoire reste constante quel que soit le nombre de calculs de l'utilisateur.
+EXPORT_BATCH_ROWS = 2000
+EXPORT_COLUMNS = ('id', 'timestamp', 'compound_A', 'compound_B', 'x_A', 'T', 'D_exp', 'D_calc', 'error')
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+def _compound_names(name):
+    # Le nom est enregistré tel qu'affiché (fr, en ou ar) : on cherche toutes ses traductions#
+    for key, names in compound_translations.items():
+        if name == key or name in names.values():
+            return {key, *names.values()}
+    return {name}
+
+def _float_arg(args, field):
+    try:
+        return float(args[field].replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"Valeur non numérique pour {field} : '{args[field]}'")
+
+def parse_export_filters(args):
+    """
+    Filtres d'export depuis la requête : compound_A, compound_B (nom dans n'importe quelle langue),
+    T_min, T_max (K), date_from / date_to (AAAA-MM-JJ, bornes incluses) et limit (lignes les plus récentes).
+    Lève ValueError si un filtre est invalide.
+    """
+    filters = {}
+    for field in ('compound_A', 'compound_B'):
+        if args.get(field):
+            filters[field] = args[field]
+    for field in ('T_min', 'T_max'):
+        if args.get(field):
+            filters[field] = _float_arg(args, field)
+    for field in ('date_from', 'date_to'):
+        if args.get(field):
+            try:
+                filters[field] = datetime.strptime(args[field], '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                raise ValueError(f"Date invalide pour {field} (format AAAA-MM-JJ)")
+    if args.get('limit'):
+        try:
+            filters['limit'] = int(args['limit'])
+        except ValueError:
+            raise ValueError("limit doit être un entier")
+        if filters['limit'] <= 0:
+            raise ValueError("limit doit être strictement positif")
+    return filters
+
+def _conditions(user_id, filters):
+    conditions = [Calculation.user_id == user_id]
+    if filters.get('compound_A'):
+        conditions.append(Calculation.compound_A.in_(_compound_names(filters['compound_A'])))
+    if filters.get('compound_B'):
+        conditions.append(Calculation.compound_B.in_(_compound_names(filters['compound_B'])))
+    if filters.get('T_min') is not None:
+        conditions.append(Calculation.T >= filters['T_min'])
+    if filters.get('T_max') is not None:
+        conditions.append(Calculation.T <= filters['T_max'])
+    if filters.get('date_from'):
+        conditions.append(Calculation.timestamp >= datetime.fromisoformat(filters['date_from']))
+    if filters.get('date_to'):
+        conditions.append(Calculation.timestamp < datetime.fromisoformat(filters['date_to']) + timedelta(days=1))
+    return conditions
+
+def history_query(user_id, filters):
+    """ Calculs filtrés de l'utilisateur (objets Calculation), du plus récent au plus ancien """
+    query = Calculation.query.filter(*_conditions(user_id, filters))
+    query = query.order_by(Calculation.timestamp.desc().nulls_last(), Calculation.id.desc())
+    if filters.get('limit'):
+        query = query.limit(filters['limit'])
+    return query
+
+def history_count(user_id, filters):
+    count = db.session.query(db.func.count(Calculation.id)).filter(*_conditions(user_id, filters)).scalar()
+    return min(count, filters['limit']) if filters.get('limit') else count
+
+def iter_history_rows(user_id, filters):
+    """
+    Tuples EXPORT_COLUMNS lus par curseur côté serveur, EXPORT_BATCH_ROWS lignes à la fois.
+    """
+    statement = db.select(*(getattr(Calculation, c) for c in EXPORT_COLUMNS)).where(*_conditions(user_id, filters))
+    statement = statement.order_by(Calculation.timestamp.desc().nulls_last(), Calculation.id.desc())
+    if filters.get('limit'):
+        statement = statement.limit(filters['limit'])
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=EXPORT_BATCH_ROWS))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    for n, row in enumerate(rows, start=1):
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if n % EXPORT_BATCH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record['timestamp'] = record['timestamp'].isoformat() if record['timestamp'] else None
+        lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        if len(lines) == EXPORT_BATCH_ROWS:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+def _gzip(chunks):
+    # Compression gzip en flux (wbits=31 : en-tête et somme de contrôle gzip)#
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_history(user_id, filters, fmt='csv', compress=False):
+    """
+    Générateur de l'export (octets) au format 'csv' ou 'ndjson', éventuellement compressé en gzip.
+    """
+    chunks = (_csv_chunks if fmt == 'csv' else _ndjson_chunks)(iter_history_rows(user_id, filters))
+    if compress:
+        return _gzip(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
@@ -0,0 +1,106 @@
+import atexit
+import os
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from . import db
+from .models import Calculation
+
+# --- Écriture différée (write-behind) de l'historique des calculs ---#
+# Les calculs sont mis en tampon en mémoire puis insérés en masse (un INSERT multi-lignes et un
+# seul commit) dès que HISTORY_FLUSH_SIZE lignes sont en attente ou toutes les
+# HISTORY_FLUSH_SECONDS secondes. Le tampon est vidé à l'arrêt du worker (atexit).
+# Au-delà de HISTORY_MAX_PENDING lignes (base lente ou indisponible), l'appelant écrit lui-même
+# de façon synchrone ; si l'écriture échoue encore, les lignes les plus anciennes au-delà de la
+# limite sont abandonnées (erreur journalisée) : la mémoire du worker reste bornée.
+# Les pages d'historique fusionnent les écritures encore en attente de l'utilisateur dans le
+# worker qui sert la page ; celles mises en tampon par un autre worker apparaissent au plus tard
+# après HISTORY_FLUSH_SECONDS secondes.
+HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', 100))
+HISTORY_MAX_PENDING = int(os.getenv('HISTORY_MAX_PENDING', 10000))
+HISTORY_FLUSH_SECONDS = float(os.getenv('HISTORY_FLUSH_SECONDS', 2.0))
+HISTORY_FIELDS = ('user_id', 'compound_A', 'compound_B', 'x_A', 'T', 'D_exp', 'D_calc', 'error', 'timestamp')
+
+class HistoryBuffer:
+    def __init__(self):
+        self._app = None
+        self._pending = []
+        self._in_flight = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def init_app(self, app):
+        self._app = app
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        # Un thread de vidage par processus (démarré après le fork des workers)#
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wake = threading.Event()
+                threading.Thread(target=self._loop, name="history-flush", daemon=True).start()
+                self._pid = os.getpid()
+
+    def record(self, user_id, compound_A, compound_B, x_A, T, D_exp, D_calc, error):
+        """ Met un calcul en attente d'insertion """
+        self.record_many([dict(user_id=user_id, compound_A=compound_A, compound_B=compound_B,
+                               x_A=x_A, T=T, D_exp=D_exp, D_calc=D_calc, error=error)])
+
+    def record_many(self, rows):
+        """ Met plusieurs calculs en attente (dicts avec les colonnes de Calculation) """
+        now = datetime.utcnow()
+        rows = [{field: row.get(field) for field in HISTORY_FIELDS} | {'timestamp': row.get('timestamp') or now} for row in rows]
+        if not rows:
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._pending.extend(rows)
+            size = len(self._pending)
+        if size >= HISTORY_MAX_PENDING:
+            self.flush()
+        elif size >= HISTORY_FLUSH_SIZE:
+            self._wake.set()
+
+    def pending_for_user(self, user_id):
+        """ Calculs de l'utilisateur pas encore écrits en base par ce worker, du plus récent au plus ancien """
+        with self._lock:
+            rows = [row for row in self._in_flight + self._pending if row['user_id'] == user_id]
+        return [SimpleNamespace(id=None, **row) for row in reversed(rows)]
+
+    def flush(self):
+        """ Insère en masse les calculs en attente ; en cas d'échec ils sont remis en file (dans la limite de HISTORY_MAX_PENDING) """
+        with self._flush_lock:
+            with self._lock:
+                self._in_flight, self._pending = self._pending, []
+                rows = self._in_flight
+            if not rows or self._app is None:
+                return 0
+            try:
+                with self._app.app_context():
+                    db.session.execute(db.insert(Calculation), rows)
+                    db.session.commit()
+            except Exception as e:
+                with self._lock:
+                    self._pending[:0] = rows
+                    self._in_flight = []
+                    dropped = max(0, len(self._pending) - HISTORY_MAX_PENDING)
+                    del self._pending[:dropped]
+                self._app.logger.error(f"[history] Échec de l'écriture de {len(rows)} calcul(s) : {e}")
+                if dropped:
+                    self._app.logger.error(f"[history] Tampon plein : {dropped} calcul(s) les plus anciens abandonnés")
+                return 0
+            with self._lock:
+                self._in_flight = []
+            return len(rows)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(HISTORY_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+history = HistoryBuffer()
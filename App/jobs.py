@@ -0,0 +1,312 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from flask import Blueprint, jsonify, send_file, current_app, abort, url_for
+from flask_login import login_required, current_user
+
+# --- Exécution locale de tâches longues (calculs en lot, exports) ---#
+# File persistante dans une base SQLite locale (aucun broker externe) et pool borné de threads
+# dans chaque worker gunicorn. Les workers d'un même hôte se partagent la file : une tâche est
+# réservée par un UPDATE atomique. Pendant l'exécution, le runner rafraîchit le battement de cœur
+# toutes les JOB_HEARTBEAT_SECONDS ; une tâche "running" sans battement depuis JOB_STALE_SECONDS
+# (worker tué) est remise en file, au plus JOB_MAX_ATTEMPTS fois en tout, puis marquée 'failed'.
+JOBS_DIR = os.getenv('JOBS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'jobs'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = 1.0
+JOB_HEARTBEAT_SECONDS = 30.0
+JOB_STALE_SECONDS = 600
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+_handlers = {}
+
+def job_handler(kind):
+    """
+    Enregistre la fonction qui exécute les tâches de type `kind` : handler(job, params).
+    Le handler écrit son résultat avec job.output_path(...) et renvoie (nom du fichier, type MIME).
+    """
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+class JobCancelled(Exception):
+    pass
+
+def _connect():
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(JOBS_DIR, 'jobs.sqlite3'), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY, user_id INTEGER, kind TEXT NOT NULL, params TEXT,
+        status TEXT NOT NULL, progress REAL DEFAULT 0, message TEXT,
+        result_path TEXT, result_name TEXT, result_mimetype TEXT, error TEXT,
+        cancel_requested INTEGER DEFAULT 0, created_at REAL, started_at REAL,
+        finished_at REAL, heartbeat_at REAL, attempts INTEGER DEFAULT 0)""")
+    if 'attempts' not in {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}:
+        # File créée avant le comptage des tentatives#
+        try:
+            conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass  # colonne ajoutée entre-temps par un autre processus
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at)")
+    return conn
+
+def job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+def submit_job(kind, user_id, params=None, input_file=None):
+    """
+    Met une tâche en file et renvoie son identifiant. `input_file` (objet fichier) est copié
+    dans le répertoire de la tâche sous le nom 'input'.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Type de tâche inconnu : {kind}")
+    job_id = uuid.uuid4().hex
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    if input_file is not None:
+        with open(os.path.join(job_dir(job_id), 'input'), 'wb') as f:
+            shutil.copyfileobj(input_file, f)
+    conn = _connect()
+    try:
+        conn.execute("INSERT INTO jobs (id, user_id, kind, params, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                     (job_id, user_id, kind, json.dumps(params or {}), time.time()))
+    finally:
+        conn.close()
+    _runner.wake()
+    return job_id
+
+def get_job(job_id):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def list_jobs(user_id, limit=50):
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+def cancel_job(job_id):
+    """
+    Annule une tâche en file immédiatement ; une tâche en cours s'arrête à son prochain point de progression.
+    """
+    conn = _connect()
+    try:
+        conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+    finally:
+        conn.close()
+
+class JobContext:
+    """
+    Vue d'une tâche en cours pour son handler : paramètres, fichiers et progression.
+    """
+    def __init__(self, row, conn):
+        self.id = row['id']
+        self.user_id = row['user_id']
+        self.kind = row['kind']
+        self.started_at = row['started_at']
+        self.dir = job_dir(self.id)
+        self._conn = conn
+
+    @property
+    def input_path(self):
+        return os.path.join(self.dir, 'input')
+
+    def output_path(self, filename):
+        return os.path.join(self.dir, filename)
+
+    def progress(self, fraction, message=None):
+        """ Met à jour la progression (0..1) ; lève JobCancelled si l'annulation a été demandée """
+        self._conn.execute("UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? WHERE id = ?",
+                           (min(max(fraction, 0.0), 1.0), message, time.time(), self.id))
+        row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.id,)).fetchone()
+        if row and row['cancel_requested']:
+            raise JobCancelled()
+
+class JobRunner:
+    """
+    Pool borné de threads qui réservent et exécutent les tâches de la file.
+    Démarré paresseusement une fois par processus (donc après le fork des workers).
+    """
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._app = None
+        self._last_purge = 0.0
+
+    def ensure_started(self, app):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._app = app
+            self._wake = threading.Event()
+            for n in range(JOB_WORKERS):
+                threading.Thread(target=self._loop, name=f"job-worker-{n}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def wake(self):
+        self._wake.set()
+
+    def _claim(self, conn):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Tâches abandonnées qui ont épuisé leurs tentatives (chaque exécution a fait tomber son worker)#
+            conn.execute("""UPDATE jobs SET status = 'failed', finished_at = ?,
+                            error = 'Abandon après ' || attempts || ' tentatives interrompues'
+                            WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?""",
+                         (now, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS))
+            row = conn.execute("""SELECT * FROM jobs WHERE status = 'queued'
+                                  OR (status = 'running' AND heartbeat_at < ?)
+                                  ORDER BY created_at LIMIT 1""", (now - JOB_STALE_SECONDS,)).fetchone()
+            if row is not None:
+                conn.execute("""UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, progress = 0,
+                                attempts = COALESCE(attempts, 0) + 1 WHERE id = ?""",
+                             (now, now, row['id']))
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    @staticmethod
+    def _heartbeat(job_id, started_at, stop):
+        # Battement de cœur pendant que le handler s'exécute (sa propre connexion, thread séparé)#
+        conn = _connect()
+        try:
+            while not stop.wait(JOB_HEARTBEAT_SECONDS):
+                conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND started_at = ?",
+                             (time.time(), job_id, started_at))
+        finally:
+            conn.close()
+
+    def _purge(self, conn):
+        # Suppression périodique des tâches terminées trop anciennes et de leurs fichiers#
+        if time.time() - self._last_purge < 3600:
+            return
+        self._last_purge = time.time()
+        limit = time.time() - JOB_RETENTION_SECONDS
+        old = conn.execute("SELECT id FROM jobs WHERE finished_at < ?", (limit,)).fetchall()
+        for row in old:
+            shutil.rmtree(job_dir(row['id']), ignore_errors=True)
+        conn.execute("DELETE FROM jobs WHERE finished_at < ?", (limit,))
+
+    def _loop(self):
+        while True:
+            try:
+                conn = _connect()
+                try:
+                    self._purge(conn)
+                    row = self._claim(conn)
+                    if row is None:
+                        self._wake.wait(JOB_POLL_SECONDS)
+                        self._wake.clear()
+                        continue
+                    self._run(row, conn)
+                finally:
+                    conn.close()
+            except Exception:
+                traceback.print_exc()
+                time.sleep(JOB_POLL_SECONDS)
+
+    def _run(self, row, conn):
+        job = JobContext(row, conn)
+        handler = _handlers.get(row['kind'])
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job.id, job.started_at, stop), name=f"job-heartbeat-{job.id[:8]}", daemon=True)
+        beat.start()
+        # Les mises à jour finales ne concernent que cette exécution (pas une reprise ultérieure)#
+        try:
+            if handler is None:
+                raise ValueError(f"Type de tâche inconnu : {row['kind']}")
+            with self._app.app_context():
+                result_name, mimetype = handler(job, json.loads(row['params'] or '{}'))
+            conn.execute("""UPDATE jobs SET status = 'done', progress = 1, result_path = ?, result_name = ?,
+                            result_mimetype = ?, finished_at = ? WHERE id = ? AND started_at = ?""",
+                         (job.output_path(result_name), result_name, mimetype, time.time(), job.id, job.started_at))
+        except JobCancelled:
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND started_at = ?",
+                         (time.time(), job.id, job.started_at))
+        except Exception as e:
+            self._app.logger.error(f"[jobs] Échec de la tâche {job.id} ({row['kind']}) : {e}")
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND started_at = ?",
+                         (str(e), time.time(), job.id, job.started_at))
+        finally:
+            stop.set()
+            beat.join()
+
+_runner = JobRunner()
+
+def init_app(app):
+    """
+    Démarre le pool de tâches au premier appel traité par chaque processus.
+    """
+    @app.before_request
+    def _start_job_runner():
+        _runner.ensure_started(app)
+
+# ------------------- Routes ------------------- #
+def _job_json(job):
+    data = {k: job[k] for k in ('id', 'kind', 'status', 'progress', 'message', 'error', 'attempts', 'created_at', 'started_at', 'finished_at')}
+    data['status_url'] = url_for('jobs.job_status', job_id=job['id'])
+    if job['status'] == 'done':
+        data['download_url'] = url_for('jobs.job_download', job_id=job['id'])
+    return data
+
+def _own_job(job_id):
+    job = get_job(job_id)
+    if job is None or job['user_id'] != current_user.id:
+        abort(404)
+    return job
+
+@jobs_bp.route('', methods=['GET'])
+@login_required
+def job_list():
+    return jsonify({'jobs': [_job_json(job) for job in list_jobs(current_user.id)]})
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    return jsonify(_job_json(_own_job(job_id)))
+
+@jobs_bp.route('/<job_id>/download', methods=['GET'])
+@login_required
+def job_download(job_id):
+    job = _own_job(job_id)
+    if job['status'] != 'done' or not job['result_path'] or not os.path.exists(job['result_path']):
+        return jsonify({'error': 'Résultat non disponible', 'status': job['status']}), 409
+    return send_file(job['result_path'], mimetype=job['result_mimetype'], as_attachment=True, download_name=job['result_name'])
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+@login_required
+def job_cancel(job_id):
+    _own_job(job_id)
+    cancel_job(job_id)
+    return jsonify(_job_json(get_job(job_id)))
+
+def job_accepted(job_id):
+    """ Réponse 202 standard pour une tâche soumise depuis une route """
+    current_app.logger.info(f"[jobs] Tâche {job_id} soumise")
+    response = jsonify({'job_id': job_id, 'status_url': url_for('jobs.job_status', job_id=job_id)})
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.job_status', job_id=job_id)
+    return response
@@ -0,0 +1,133 @@
+import atexit
+import os
+import smtplib
+import threading
+import time
+from flask import render_template
+from markupsafe import escape
+from . import mail
+from .metrics import span
+
+# --- Envoi différé des e-mails (file en mémoire, connexion SMTP réutilisée) ---#
+# Les routes mettent les messages en file et répondent aussitôt ; un thread par processus les
+# envoie par lots de MAIL_BATCH_SIZE sur une seule connexion SMTP (mail.connect()). Un message en
+# échec est retenté jusqu'à MAIL_MAX_ATTEMPTS fois avec un délai doublé à chaque tentative.
+# La file est vidée à l'arrêt du worker (atexit).
+# Test local : MAIL_SERVER=localhost MAIL_PORT=1025 avec un serveur SMTP de test,
+# par exemple `python -m aiosmtpd -n -l localhost:1025`.
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+MAIL_RETRY_SECONDS = float(os.getenv('MAIL_RETRY_SECONDS', 2.0))
+MAIL_IDLE_SECONDS = 5.0
+CODE_PLACEHOLDER = '__CALC_DIFF_CODE__'
+
+class MailDispatcher:
+    def __init__(self):
+        self._app = None
+        self._pending = []  # [heure de la prochaine tentative, tentatives, message]
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._html = {}
+
+    def init_app(self, app):
+        self._app = app
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        # Un thread d'envoi par processus (démarré après le fork des workers)#
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wake = threading.Event()
+                threading.Thread(target=self._loop, name="mail-dispatch", daemon=True).start()
+                self._pid = os.getpid()
+
+    def send(self, msg):
+        """ Met un flask_mail.Message en file d'envoi """
+        self._ensure_thread()
+        with self._lock:
+            self._pending.append([0.0, 0, msg])
+        self._wake.set()
+
+    def confirmation_html(self, code, locale):
+        """
+        Corps HTML de l'e-mail de confirmation : msg.html est rendu une fois par langue avec
+        un marqueur, remplacé ensuite par le code.
+        """
+        if locale not in self._html:
+            self._html[locale] = render_template('msg.html', code=CODE_PLACEHOLDER, lang=locale)
+        return self._html[locale].replace(CODE_PLACEHOLDER, str(escape(code)))
+
+    def _take(self):
+        now = time.time()
+        with self._lock:
+            batch = [item for item in self._pending if item[0] <= now][:MAIL_BATCH_SIZE]
+            for item in batch:
+                self._pending.remove(item)
+        return batch
+
+    def _retry_later(self, items, error):
+        now = time.time()
+        retry = []
+        for item in items:
+            item[1] += 1
+            if item[1] >= MAIL_MAX_ATTEMPTS:
+                self._app.logger.error(f"[mail] Abandon après {item[1]} tentatives ({item[2].recipients}) : {error}")
+            else:
+                item[0] = now + MAIL_RETRY_SECONDS * 2 ** (item[1] - 1)
+                retry.append(item)
+        with self._lock:
+            self._pending.extend(retry)
+
+    def _send_batch(self, batch):
+        sent = 0
+        remaining = list(batch)
+        try:
+            with self._app.app_context(), mail.connect() as conn:
+                while remaining:
+                    try:
+                        with span('mail_send'):
+                            conn.send(remaining[0][2])
+                        sent += 1
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        # Refus propre à ce message : la connexion reste utilisable#
+                        self._retry_later([remaining[0]], e)
+                    remaining.pop(0)
+        except Exception as e:
+            # Connexion impossible ou perdue : tout ce qui n'est pas parti est retenté#
+            self._retry_later(remaining, e)
+        return sent
+
+    def flush(self):
+        """ Envoie immédiatement tous les messages en file (retentes comprises) ; renvoie le nombre envoyé """
+        if self._app is None:
+            return 0
+        sent = 0
+        with self._send_lock:
+            with self._lock:
+                items, self._pending = self._pending, []
+            for start in range(0, len(items), MAIL_BATCH_SIZE):
+                sent += self._send_batch(items[start:start + MAIL_BATCH_SIZE])
+        return sent
+
+    def _next_delay(self):
+        with self._lock:
+            if not self._pending:
+                return MAIL_IDLE_SECONDS
+            return min(max(min(item[0] for item in self._pending) - time.time(), 0.0), MAIL_IDLE_SECONDS)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self._next_delay())
+            self._wake.clear()
+            with self._send_lock:
+                while True:
+                    batch = self._take()
+                    if not batch:
+                        break
+                    self._send_batch(batch)
+
+mailer = MailDispatcher()
@@ -0,0 +1,317 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+try:
+    import fcntl
+except ImportError:  # Windows (serveur de développement, un seul processus)
+    fcntl = None
+
+# --- Mesures de latence (histogrammes) et point d'exposition au format Prometheus ---#
+# Chaque processus cumule ses histogrammes en mémoire (quelques µs par mesure) et les écrit
+# toutes les METRICS_DUMP_SECONDS secondes dans METRICS_DIR/metrics-<pid>-<démarrage>.json ;
+# /metrics additionne les fichiers de tous les workers de l'hôte. Les jauges ne sont reprises que
+# des fichiers récents (workers vivants). Les fichiers inactifs depuis METRICS_RETENTION_SECONDS
+# (workers arrêtés) sont ajoutés au cumul persistant aggregate.json puis supprimés : les compteurs
+# exposés ne diminuent jamais.
+# Accès à /metrics : jeton METRICS_TOKEN (en-tête Authorization: Bearer) ; sans jeton, refusé
+# sauf en debug/test ou avec METRICS_PUBLIC=1.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'metrics'))
+METRICS_DUMP_SECONDS = float(os.getenv('METRICS_DUMP_SECONDS', 5.0))
+METRICS_RETENTION_SECONDS = 24 * 3600
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC') == '1'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_METRIC = 'calcdiff_http_request_duration_seconds'
+SPAN_METRIC = 'calcdiff_span_duration_seconds'
+HELP = {
+    HTTP_METRIC: "Durée de traitement des requêtes HTTP par route.",
+    SPAN_METRIC: "Durée des opérations instrumentées (calcul UNIFAC, base de données, gabarits, PDF, chatbot, e-mail).",
+}
+COUNTERS = set()
+
+def register_counter(name, help_text):
+    """ Déclare un compteur (nom Prometheus en _total) incrémenté par registry.count """
+    HELP[name] = help_text
+    COUNTERS.add(name)
+
+class Registry:
+    """
+    Histogrammes du processus : (nom, étiquettes) → [effectifs par intervalle..., somme].
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._gauges = {}
+        self._pid = None
+        self._file = None
+
+    def _ensure_process(self):
+        # Après un fork, le worker repart de zéro et lance son propre thread d'écriture#
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._series = {}
+                self._pid = os.getpid()
+                # Nom unique même si le pid est réutilisé par un worker ultérieur#
+                self._file = f"metrics-{self._pid}-{int(time.time() * 1000)}.json"
+                threading.Thread(target=self._loop, name="metrics-dump", daemon=True).start()
+
+    def observe(self, name, labels, seconds):
+        self._ensure_process()
+        k = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            values = self._series.get((name, labels))
+            if values is None:
+                values = self._series[(name, labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+            values[k] += 1
+            values[-1] += seconds
+
+    def count(self, name, labels, amount=1):
+        self._ensure_process()
+        with self._lock:
+            values = self._series.get((name, labels))
+            if values is None:
+                values = self._series[(name, labels)] = [0]
+            values[0] += amount
+
+    def register_gauge(self, name, help_text, fn, aggregate='sum'):
+        """
+        Jauge lue au moment de l'écriture ; valeurs des workers additionnées ('sum') ou, pour une
+        grandeur commune à l'hôte, réduites au maximum ('max'). Une jauge qui lève est omise.
+        """
+        self._gauges[name] = (help_text, fn, aggregate)
+
+    def snapshot(self):
+        with self._lock:
+            series = [[name, list(labels), list(values)] for (name, labels), values in self._series.items()]
+        gauges = {}
+        for name, (help_text, fn, aggregate) in self._gauges.items():
+            try:
+                gauges[name] = [help_text, float(fn()), aggregate]
+            except Exception:
+                pass
+        return {'pid': os.getpid(), 'time': time.time(), 'series': series, 'gauges': gauges}
+
+    def dump(self):
+        if self._pid != os.getpid():
+            return
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, self._file)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def _loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(METRICS_DUMP_SECONDS)
+            try:
+                self.dump()
+            except OSError:
+                pass
+
+registry = Registry()
+atexit.register(lambda: registry.dump())
+
+@contextmanager
+def span(name):
+    """ Mesure la durée du bloc sous le nom `name` """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(SPAN_METRIC, (('span', name),), time.perf_counter() - start)
+
+def timed(name):
+    """ Décorateur : mesure chaque appel de la fonction sous le nom `name` """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(SPAN_METRIC, (('span', name),), time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def _merge_series(series, items):
+    for name, labels, values in items:
+        total = series.setdefault((name, tuple(tuple(pair) for pair in labels)), [0] * len(values))
+        for k, value in enumerate(values):
+            total[k] += value
+
+def _fold_expired(now):
+    """
+    Ajoute au cumul persistant les compteurs des fichiers expirés (workers arrêtés), supprime ces
+    fichiers et renvoie les séries du cumul. Verrou exclusif entre workers pendant l'opération.
+    """
+    aggregate_path = os.path.join(METRICS_DIR, 'aggregate.json')
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, 'aggregate.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregate = {}
+        try:
+            with open(aggregate_path, encoding='utf-8') as f:
+                _merge_series(aggregate, json.load(f)['series'])
+        except (OSError, ValueError):
+            pass
+        expired = [path for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json'))
+                   if now - os.path.getmtime(path) > METRICS_RETENTION_SECONDS]
+        if expired:
+            for path in expired:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        _merge_series(aggregate, json.load(f)['series'])
+                except (OSError, ValueError):
+                    pass
+            series = [[name, [list(pair) for pair in labels], values] for (name, labels), values in aggregate.items()]
+            with open(f"{aggregate_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({'series': series}, f)
+            os.replace(f"{aggregate_path}.tmp", aggregate_path)
+            for path in expired:
+                os.remove(path)
+    return aggregate
+
+def collect():
+    """
+    Additionne le cumul des workers arrêtés et les fichiers des workers actifs : (histogrammes, jauges).
+    """
+    registry.dump()
+    now = time.time()
+    series, gauges = _fold_expired(now), {}
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _merge_series(series, data['series'])
+        if now - data['time'] <= 3 * METRICS_DUMP_SECONDS:
+            for name, (help_text, value, aggregate) in data['gauges'].items():
+                if name not in gauges:
+                    gauges[name] = [help_text, value]
+                elif aggregate == 'max':
+                    gauges[name][1] = max(gauges[name][1], value)
+                else:
+                    gauges[name][1] += value
+    return series, gauges
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def render_prometheus():
+    """ Texte d'exposition Prometheus (version 0.0.4) """
+    series, gauges = collect()
+    lines = []
+    for name in sorted({name for name, _ in series}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} {'counter' if name in COUNTERS else 'histogram'}")
+        for (series_name, labels), values in sorted(series.items()):
+            if series_name != name:
+                continue
+            if name in COUNTERS:
+                lines.append(f"{name}{_labels(labels)} {values[0]}")
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', repr(bound))])} {cumulative}")
+            cumulative += values[len(BUCKETS)]
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    for name, (help_text, value) in sorted(gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+_sqlalchemy_hooks_installed = False
+
+def _install_sqlalchemy_hooks():
+    # Requêtes (toutes connexions) et commits de session ; écouteurs globaux posés une seule fois#
+    global _sqlalchemy_hooks_installed
+    if _sqlalchemy_hooks_installed:
+        return
+    _sqlalchemy_hooks_installed = True
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_query(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if starts:
+            registry.observe(SPAN_METRIC, (('span', 'db_query'),), time.perf_counter() - starts.pop())
+
+    @event.listens_for(Session, 'before_commit')
+    def _before_commit(session):
+        session.info['metrics_commit_start'] = time.perf_counter()
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        start = session.info.pop('metrics_commit_start', None)
+        if start is not None:
+            registry.observe(SPAN_METRIC, (('span', 'db_commit'),), time.perf_counter() - start)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(session):
+        session.info.pop('metrics_commit_start', None)
+
+def init_app(app):
+    """
+    Latence par route, rendu des gabarits, base de données et point /metrics.
+    """
+    from flask import Response, g, request, abort
+    from flask.signals import before_render_template, template_rendered
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            registry.observe(HTTP_METRIC, (('method', request.method), ('route', route), ('status', str(response.status_code))),
+                             time.perf_counter() - start)
+        return response
+
+    def _before_template(sender, template, context, **extra):
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+    def _after_template(sender, template, context, **extra):
+        starts = g.get('metrics_templates')
+        if starts:
+            registry.observe(SPAN_METRIC, (('span', 'render_template'),), time.perf_counter() - starts.pop())
+
+    before_render_template.connect(_before_template, app, weak=False)
+    template_rendered.connect(_after_template, app, weak=False)
+    _install_sqlalchemy_hooks()
+
+    def metrics_view():
+        if METRICS_TOKEN:
+            if request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+                abort(401)
+        elif not (METRICS_PUBLIC or app.debug or app.testing):
+            abort(403)
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
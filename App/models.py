@@ -1,8 +1,10 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from .security import hash_password, verify_password
 from . import db
 import re
 from datetime import datetime
+import click
+from flask.cli import with_appcontext
 
 class Formulaire(db.Model, UserMixin):
     __tablename__ = 'formulaire'
@@ -33,9 +35,9 @@ class Formulaire(db.Model, UserMixin):
             raise ValueError("Le mot de passe doit contenir au moins une lettre majuscule.")
         if not any(c.isdigit() for c in password):
             raise ValueError("Le mot de passe doit contenir au moins un chiffre.")
-        self.password = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password = hash_password(password, method='pbkdf2:sha256')
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
     @staticmethod
     def is_valid_email(email):
         return re.match(r"[^@]+@[^@]+\.[^@]+", email) is not None
@@ -43,6 +45,8 @@ class Formulaire(db.Model, UserMixin):
         return str(self.id)
 # ✅ Modèle pour stocker les historiques de calculs
 class Calculation(db.Model):
+    # Index composite pour l'historique paginé d'un utilisateur (tri par date)
+    __table_args__ = (db.Index('ix_calculation_user_id_timestamp', 'user_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('formulaire.id'), nullable=False)
     compound_A = db.Column(db.String(100))
@@ -53,3 +57,14 @@ class Calculation(db.Model):
     D_calc = db.Column(db.Float)
     error = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ✅ Création des tables et index manquants (bases existantes comprises)
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Crée les tables et les index manquants sans toucher aux données."""
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    click.echo("Tables et index à jour.")
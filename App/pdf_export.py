@@ -0,0 +1,208 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from itertools import islice
+from flask import render_template
+from xml.sax.saxutils import escape
+from . import db
+from .models import Calculation, Formulaire
+from .jobs import job_handler
+from .exports import parse_export_filters, history_query, history_count
+from .metrics import span
+
+# --- Export PDF de l'historique, hors du chemin des requêtes ---#
+# Les calculs sont lus par blocs (yield_per) et mis en page bloc par bloc ; le PDF est écrit
+# directement dans un fichier. Les fichiers produits sont conservés dans PDF_CACHE_DIR sous une
+# clé (utilisateur, paramètres, dernier calcul) : un nouveau calcul invalide naturellement le cache
+# et l'ancienne version est supprimée à l'écriture de la suivante. Le dossier est borné en âge
+# (PDF_CACHE_MAX_AGE_DAYS) et en taille (PDF_CACHE_MAX_MB, les moins récemment servis d'abord).
+# Deux moteurs : 'weasyprint' (gabarit pdf.html) et 'reportlab' (tableau simple, rapide sur les gros historiques).
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'pdf_cache'))
+PDF_CHUNK_ROWS = int(os.getenv('PDF_CHUNK_ROWS', 1000))
+PDF_SYNC_MAX_ROWS = int(os.getenv('PDF_SYNC_MAX_ROWS', 200))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_MB', 500)) * 1024 * 1024
+PDF_CACHE_MAX_AGE = float(os.getenv('PDF_CACHE_MAX_AGE_DAYS', 7)) * 86400
+PDF_RENDERERS = ('weasyprint', 'reportlab')
+PDF_HEADER = ['Date', 'Composé A', 'Composé B', 'xA', 'T (K)', 'D_exp', 'D_calc', 'Erreur (%)']
+
+def parse_export_params(args):
+    """
+    Paramètres d'export : filtres communs (voir exports.parse_export_filters) et renderer.
+    Lève ValueError sinon.
+    """
+    params = parse_export_filters(args)
+    params['renderer'] = args.get('renderer', 'weasyprint')
+    if params['renderer'] not in PDF_RENDERERS:
+        raise ValueError(f"Moteur PDF inconnu : {params['renderer']}")
+    return params
+
+def _cache_prefix(user_id, params):
+    # Partie de la clé commune à toutes les versions d'un même export#
+    key = json.dumps({'user': user_id, **params}, sort_keys=True)
+    return f"{user_id}-{hashlib.sha256(key.encode()).hexdigest()[:24]}"
+
+def cache_path(user_id, params):
+    """ Fichier de cache du PDF pour l'état actuel de l'historique de l'utilisateur """
+    last_id = db.session.query(db.func.max(Calculation.id)).filter(Calculation.user_id == user_id).scalar()
+    return os.path.join(PDF_CACHE_DIR, f"{_cache_prefix(user_id, params)}-{last_id or 0}.pdf")
+
+def prune_cache(keep=None):
+    """
+    Supprime les PDF plus anciens que PDF_CACHE_MAX_AGE, puis les moins récemment servis
+    jusqu'à repasser sous PDF_CACHE_MAX_BYTES (le fichier `keep` est conservé).
+    """
+    now, entries = time.time(), []
+    for entry in os.scandir(PDF_CACHE_DIR) if os.path.isdir(PDF_CACHE_DIR) else ():
+        try:
+            stat = entry.stat()
+            temporary = not entry.name.endswith('.pdf')
+            # Fichiers temporaires : seulement ceux d'un rendu interrompu depuis longtemps#
+            if now - stat.st_mtime > (3600 if temporary else PDF_CACHE_MAX_AGE):
+                os.remove(entry.path)
+            elif not temporary:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= PDF_CACHE_MAX_BYTES:
+            break
+        if path != keep:
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+def _chunks(query, progress=None, total=None):
+    rows = iter(query.yield_per(PDF_CHUNK_ROWS))
+    done = 0
+    while True:
+        chunk = list(islice(rows, PDF_CHUNK_ROWS))
+        if not chunk:
+            return
+        done += len(chunk)
+        if progress and total:
+            progress(0.9 * done / total, f"{done}/{total} lignes mises en page")
+        yield chunk
+
+def _temp_file(path, suffix):
+    # Nom unique à côté de `path` : deux rendus simultanés du même export ne partagent aucun fichier#
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f"{os.path.basename(path)}.", suffix=suffix)
+    os.close(fd)
+    return temp_path
+
+def _render_weasyprint(chunks, path, user, now):
+    # Chaque bloc est mis en page puis écrit aussitôt dans un fichier partiel (sa mise en page est
+    # libérée avant le bloc suivant) ; les parties sont ensuite concaténées par pypdf, qui garde
+    # toutes les pages du document final en mémoire jusqu'à l'écriture#
+    from weasyprint import HTML
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(_temp_file(path, '.part'))
+            with span('write_pdf'):
+                HTML(string=render_template("pdf.html", user=user, calculations=chunk, now=now)).write_pdf(target=parts[-1])
+        if not parts:
+            with span('write_pdf'):
+                HTML(string=render_template("pdf.html", user=user, calculations=[], now=now)).write_pdf(target=path)
+        elif len(parts) == 1:
+            os.replace(parts[0], path)
+        else:
+            from pypdf import PdfWriter
+            writer = PdfWriter()
+            for part in parts:
+                writer.append(part)
+            with span('write_pdf'):
+                writer.write(path)
+            writer.close()
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+def _row_cells(c):
+    # Même présentation que le gabarit pdf.html#
+    return [c.timestamp.strftime('%d/%m/%Y'), c.compound_A, c.compound_B, "%.3f" % c.x_A, "%.1f" % c.T,
+            "%.4e" % c.D_exp if c.D_exp is not None else "—", "%.4e" % c.D_calc,
+            "%.2f" % (c.error * 100) if c.error is not None else "—"]
+
+def _render_reportlab(chunks, path, user, now):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, TableStyle
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#181818')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#bbbbbb')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
+    ])
+    def footer(canvas, doc):
+        canvas.setFont('Helvetica', 7)
+        canvas.drawRightString(doc.pagesize[0] - cm, cm, f"Page {doc.page}")
+    doc = SimpleDocTemplate(path, pagesize=landscape(A4), leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm)
+    story = [Paragraph(escape(f"Utilisateur : {user.username} — Généré le : {now.strftime('%d/%m/%Y %H:%M')}"),
+                       getSampleStyleSheet()['Normal'])]
+    # Un tableau par bloc : la découpe en pages de reportlab reste linéaire#
+    for chunk in chunks:
+        story.append(LongTable([PDF_HEADER] + [_row_cells(c) for c in chunk], repeatRows=1, style=style))
+    if len(story) == 1:
+        story.append(LongTable([PDF_HEADER], style=style))
+    with span('write_pdf'):
+        doc.build(story, onFirstPage=footer, onLaterPages=footer)
+
+def render_pdf(user_id, params, path, progress=None):
+    """
+    Écrit le PDF de l'historique dans `path` (fichier temporaire puis renommage atomique).
+    """
+    user = db.session.get(Formulaire, user_id)
+    total = history_count(user_id, params) if progress else None
+    chunks = _chunks(history_query(user_id, params), progress, total)
+    renderer = _render_reportlab if params.get('renderer') == 'reportlab' else _render_weasyprint
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = _temp_file(path, '.tmp')
+    try:
+        renderer(chunks, tmp_path, user, datetime.now())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+def cached_pdf(user_id, params):
+    """ Chemin du PDF en cache (None s'il faut le générer) """
+    path = cache_path(user_id, params)
+    try:
+        os.utime(path)  # date d'usage pour l'éviction par taille
+    except OSError:
+        return None
+    return path
+
+def export_to_cache(user_id, params, progress=None):
+    """ Génère le PDF dans le cache, supprime les versions précédentes du même export puis borne le dossier """
+    path = render_pdf(user_id, params, cache_path(user_id, params), progress)
+    prefix = os.path.join(PDF_CACHE_DIR, _cache_prefix(user_id, params))
+    for old in glob.glob(f"{glob.escape(prefix)}-*.pdf"):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    prune_cache(keep=path)
+    return path
+
+@job_handler('export_pdf')
+def export_pdf_job(job, params):
+    """ Version tâche de fond : génère le PDF dans le cache puis le copie comme résultat de la tâche """
+    path = cached_pdf(job.user_id, params) or export_to_cache(job.user_id, params, job.progress)
+    shutil.copyfile(path, job.output_path('historique_diffusion.pdf'))
+    return 'historique_diffusion.pdf', 'application/pdf'
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+from .metrics import registry
+
+# --- Cache partagé des résultats de unifac_diffusion (tous les workers d'un hôte) ---#
+# Base SQLite locale (WAL, sans fsync : ce n'est qu'un cache) indexée par les entrées normalisées
+# (empreinte des paramètres, mode exact ou grille de τ, composés, x1 et T à 12 chiffres
+# significatifs). Le nombre d'entrées est borné : au-delà de UNIFAC_RESULT_CACHE_SIZE, les moins
+# récemment utilisées sont supprimées. Aucune attente sur verrou : une base occupée ou toute autre
+# erreur SQLite est ignorée et le calcul se fait normalement.
+# Désactivé par défaut : UNIFAC_RESULT_CACHE=1 l'active. Mesure (benchmarks.run --only engine,
+# 21 paires) : calcul seul 125 µs, succès 15 µs, échec 185 µs (lecture + écriture SQLite en plus
+# du calcul). Le cache n'est rentable qu'au-delà d'environ 35 % de succès, ce que n'atteignent pas
+# des saisies libres de x et T ; le tableau de bord passe déjà par la table pré-calculée
+# (unifac_tables). À activer pour des scans ou une API qui répètent les mêmes points.
+RESULT_CACHE_ENABLED = os.getenv('UNIFAC_RESULT_CACHE', '0') == '1'
+RESULT_CACHE_PATH = os.getenv('UNIFAC_RESULT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'unifac_results.sqlite3'))
+RESULT_CACHE_SIZE = int(os.getenv('UNIFAC_RESULT_CACHE_SIZE', 200000))
+RESULT_CACHE_TOUCH_SECONDS = 300  # date d'usage rafraîchie au plus une fois par intervalle
+_EVICT_EVERY = 1000
+_STATS_FLUSH_EVENTS = 200
+
+class ResultCache:
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or RESULT_CACHE_PATH
+        self.max_entries = max_entries or RESULT_CACHE_SIZE
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self._unflushed = {'hits': 0, 'misses': 0}
+        self._inserts = 0
+
+    def _conn(self):
+        # Une connexion par thread et par processus#
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, d REAL NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_results_last_used ON results (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), ('misses', 0)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def key(fingerprint, mode, comp1_name, comp2_name, x1, T):
+        return f"{fingerprint}|{mode}|{comp1_name}|{comp2_name}|{float(x1):.12g}|{float(T):.12g}"
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self._unflushed[name] += 1
+            flush = sum(self._unflushed.values()) >= _STATS_FLUSH_EVENTS
+        if flush:
+            self.flush_stats()
+
+    def get(self, key):
+        """ D en cache pour la clé, ou None """
+        try:
+            row = self._conn().execute("SELECT d, last_used FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and time.time() - row[1] > RESULT_CACHE_TOUCH_SECONDS:
+                self._conn().execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error:
+            row = None
+        self._count('hits' if row is not None else 'misses')
+        return row[0] if row is not None else None
+
+    def put(self, key, value):
+        try:
+            self._conn().execute("INSERT OR REPLACE INTO results (key, d, last_used) VALUES (?, ?, ?)", (key, float(value), time.time()))
+        except sqlite3.Error:
+            return
+        with self._lock:
+            self._inserts += 1
+            evict = self._inserts % _EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """ Ramène le cache à 90 % de sa taille maximale en supprimant les entrées les moins récemment utilisées """
+        try:
+            conn = self._conn()
+            count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                             (count - int(self.max_entries * 0.9),))
+        except sqlite3.Error:
+            pass
+
+    def flush_stats(self):
+        # Compteurs partagés mis à jour par paquets pour limiter les écritures#
+        with self._lock:
+            pending, self._unflushed = self._unflushed, {'hits': 0, 'misses': 0}
+        try:
+            conn = self._conn()
+            for name, value in pending.items():
+                if value:
+                    conn.execute("UPDATE stats SET value = value + ? WHERE name = ?", (value, name))
+        except sqlite3.Error:
+            with self._lock:
+                for name, value in pending.items():
+                    self._unflushed[name] += value
+
+    def info(self):
+        """ Statistiques du processus et de l'ensemble des workers (hits, misses, taux, entrées) """
+        self.flush_stats()
+        try:
+            conn = self._conn()
+            shared = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        except sqlite3.Error:
+            shared = {}
+        entries = self.entries()
+        total = shared.get('hits', 0) + shared.get('misses', 0)
+        local_total = self.hits + self.misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': shared.get('hits', 0),
+            'misses': shared.get('misses', 0),
+            'hit_rate': shared.get('hits', 0) / total if total else 0.0,
+            'process_hits': self.hits,
+            'process_misses': self.misses,
+            'process_hit_rate': self.hits / local_total if local_total else 0.0,
+        }
+
+    def entries(self):
+        """ Nombre d'entrées en cache (None si la base est indisponible) """
+        try:
+            return self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def clear(self):
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM results")
+            conn.execute("UPDATE stats SET value = 0")
+        except sqlite3.Error:
+            pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """ Cache partagé du processus (None si désactivé) """
+    global _cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+# Jauges /metrics : succès et échecs additionnés entre workers, taille commune à l'hôte#
+registry.register_gauge('calcdiff_unifac_result_cache_hits', "Succès du cache de résultats UNIFAC (depuis le démarrage des workers).",
+                        lambda: get_result_cache().hits)
+registry.register_gauge('calcdiff_unifac_result_cache_misses', "Échecs du cache de résultats UNIFAC (depuis le démarrage des workers).",
+                        lambda: get_result_cache().misses)
+registry.register_gauge('calcdiff_unifac_result_cache_entries', "Entrées du cache de résultats UNIFAC.",
+                        lambda: get_result_cache().entries(), aggregate='max')
@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+from . import db
+
+# --- Hachage des mots de passe hors du worker et limitation des tentatives de connexion ---#
+# PBKDF2/scrypt sont volontairement coûteux : ils s'exécutent dans un petit pool de processus
+# (HASH_WORKERS) avec au plus HASH_MAX_PENDING demandes en attente, pour qu'un afflux de
+# tentatives ne bloque pas les workers web. HASH_WORKERS=0 calcule dans le processus courant.
+# Le pool est propre à chaque worker gunicorn et ne démarre qu'au premier hachage (un pool créé
+# dans le maître ne survit pas au fork) : un seul processus par défaut, soit un par worker.
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', 1))
+HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', 16))
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10.0))
+
+# Seaux à jetons partagés par les workers de l'hôte (SQLite) : une tentative consomme un jeton
+# de l'e-mail et un de l'adresse IP ; les seaux se remplissent à raison de `rate` jetons par minute.
+# Les échecs par e-mail sont comptés dans le même magasin ; seul un blocage effectif (début ou
+# levée) est écrit en base (Formulaire.lockout_time / lockout_level).
+LOGIN_EMAIL_BURST = int(os.getenv('LOGIN_EMAIL_BURST', 5))
+LOGIN_EMAIL_RATE = float(os.getenv('LOGIN_EMAIL_RATE', 5))
+LOGIN_IP_BURST = int(os.getenv('LOGIN_IP_BURST', 20))
+LOGIN_IP_RATE = float(os.getenv('LOGIN_IP_RATE', 20))
+LOGIN_MAX_FAILURES = 3
+LOCKOUT_MINUTES = (5, 10, 15)  # durée du 1er, 2e, puis de chaque blocage suivant
+LOGIN_THROTTLE_PATH = os.getenv('LOGIN_THROTTLE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'login_throttle.sqlite3'))
+_PRUNE_EVERY = 1000
+
+class HashingBusy(ValueError):
+    def __init__(self, message="Service occupé, veuillez réessayer dans un instant."):
+        super().__init__(message)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+def _get_pool():
+    # Pool créé par processus ; 'spawn' évite de dupliquer l'état (threads, connexions) du worker#
+    global _pool, _pool_pid, _slots
+    if _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                _slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+                _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+                _pool_pid = os.getpid()
+    return _pool
+
+def _run(fn, *args, **kwargs):
+    if HASH_WORKERS <= 0:
+        return fn(*args, **kwargs)
+    pool = _get_pool()
+    # Pool saturé : refus immédiat (429/503 côté appelant) plutôt que de bloquer le worker web#
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = pool.submit(fn, *args, **kwargs)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        raise HashingBusy()
+
+def hash_password(password, method=None):
+    """ generate_password_hash exécuté dans le pool ; lève HashingBusy si le pool est saturé """
+    return _run(generate_password_hash, password, **({'method': method} if method else {}))
+
+def verify_password(password_hash, password):
+    """ check_password_hash exécuté dans le pool ; lève HashingBusy si le pool est saturé """
+    return _run(check_password_hash, password_hash, password)
+
+class LoginThrottle:
+    """
+    Seaux à jetons par e-mail et par IP, communs à tous les processus de l'hôte.
+    """
+    def __init__(self, path=None):
+        self.path = path or LOGIN_THROTTLE_PATH
+        self._local = threading.local()
+        self._calls = 0
+
+    def _conn(self):
+        # Une connexion par thread et par processus#
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS failures (email TEXT PRIMARY KEY, count INTEGER NOT NULL, updated REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def _take(conn, key, burst, rate, now):
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        tokens, updated = row if row is not None else (float(burst), now)
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate / 60.0)
+        allowed = tokens >= 1.0
+        conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                     (key, tokens - 1.0 if allowed else tokens, now))
+        return allowed
+
+    def allow(self, email, ip):
+        """ True si une tentative est autorisée pour cet e-mail et cette IP (consomme un jeton) """
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ip_ok = self._take(conn, f"ip:{ip}", LOGIN_IP_BURST, LOGIN_IP_RATE, now)
+                email_ok = self._take(conn, f"email:{email.lower()}", LOGIN_EMAIL_BURST, LOGIN_EMAIL_RATE, now)
+                self._calls += 1
+                if self._calls % _PRUNE_EVERY == 0:
+                    # Seaux pleins depuis longtemps et échecs anciens (plus d'un jour) : inutile de les garder#
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+                    conn.execute("DELETE FROM failures WHERE updated < ?", (now - 86400,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            # Stockage indisponible : on laisse passer, le blocage en base reste actif#
+            return True
+        return ip_ok and email_ok
+
+    def record_failure(self, email):
+        """
+        Compte un mot de passe erroné ; True si cet échec atteint LOGIN_MAX_FAILURES (le compteur
+        repart alors de zéro : un seul des workers concurrents déclenche le blocage).
+        """
+        key = email.lower()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT count FROM failures WHERE email = ?", (key,)).fetchone()
+                count = (row[0] if row is not None else 0) + 1
+                reached = count >= LOGIN_MAX_FAILURES
+                conn.execute("INSERT OR REPLACE INTO failures (email, count, updated) VALUES (?, ?, ?)",
+                             (key, 0 if reached else count, time.time()))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            return False
+        return reached
+
+    def failures(self, email):
+        """ Nombre d'échecs en cours pour cet e-mail """
+        try:
+            row = self._conn().execute("SELECT count FROM failures WHERE email = ?", (email.lower(),)).fetchone()
+        except sqlite3.Error:
+            return 0
+        return row[0] if row is not None else 0
+
+    def reset_failures(self, email):
+        try:
+            self._conn().execute("DELETE FROM failures WHERE email = ?", (email.lower(),))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM buckets")
+            conn.execute("DELETE FROM failures")
+        except sqlite3.Error:
+            pass
+
+login_throttle = LoginThrottle()
+
+# --- Blocage des comptes, commun à la connexion web et à l'API ---#
+def lockout_minutes_left(user, now=None):
+    """ Minutes de blocage restantes, None si le compte n'est pas bloqué """
+    now = now or datetime.utcnow()
+    if user.lockout_time and now < user.lockout_time:
+        return int((user.lockout_time - now).total_seconds() / 60)
+    return None
+
+def register_failed_login(user, now=None):
+    """
+    Compte un mot de passe erroné ; au LOGIN_MAX_FAILURES-ième, bloque le compte en base
+    et renvoie la durée du blocage en minutes (None sinon).
+    """
+    if not login_throttle.record_failure(user.email):
+        return None
+    user.lockout_level = (user.lockout_level or 0) + 1
+    minutes = LOCKOUT_MINUTES[min(user.lockout_level - 1, len(LOCKOUT_MINUTES) - 1)]
+    user.lockout_time = (now or datetime.utcnow()) + timedelta(minutes=minutes)
+    db.session.commit()
+    return minutes
+
+def register_successful_login(user):
+    """ Efface les échecs ; la base n'est écrite que s'il reste un blocage à lever """
+    login_throttle.reset_failures(user.email)
+    if user.failed_attempts or user.lockout_time or user.lockout_level:
+        user.failed_attempts = 0
+        user.lockout_time = None
+        user.lockout_level = 0
+        db.session.commit()
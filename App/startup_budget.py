@@ -0,0 +1,59 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# --- Contrôle du temps de démarrage de l'application ---#
+# Lance `python -X importtime -c "import App.wsgi"` (création de l'application comprise) dans un
+# processus neuf et échoue si le temps d'import dépasse le budget ou si une dépendance lourde,
+# réservée à un usage ponctuel (PDF, chatbot), est importée au démarrage.
+# Usage : python -m App.startup_budget --budget-ms 1500
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1500))
+LAZY_MODULES = ('weasyprint', 'chatterbot', 'spacy', 'reportlab')
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def measure(target='App.wsgi'):
+    """
+    Importe `target` dans un nouvel interpréteur et renvoie la liste des imports
+    (module, temps propre en µs, temps cumulé en µs, profondeur).
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {target}"],
+                            capture_output=True, text=True, env=os.environ.copy())
+    if result.returncode != 0:
+        raise RuntimeError(f"Échec de l'import de {target} :\n{result.stderr[-2000:]}")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            imports.append((name, int(own), int(cumulative), len(indent) // 2))
+    return imports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vérifie le budget de temps d'import de l'application.")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument('--target', default='App.wsgi')
+    parser.add_argument('--top', type=int, default=15, help="Nombre de modules les plus coûteux affichés.")
+    parser.add_argument('--forbid', action='append', default=None,
+                        help="Module interdit au démarrage (répétable ; défaut : %s)." % ', '.join(LAZY_MODULES))
+    args = parser.parse_args(argv)
+
+    imports = measure(args.target)
+    total_ms = sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000
+    forbidden = [name for name, _, _, _ in imports if name.split('.')[0] in (args.forbid or LAZY_MODULES)]
+
+    print(f"Temps d'import de {args.target} : {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms), {len(imports)} modules")
+    for name, own, cumulative, _ in sorted(imports, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {own / 1000:8.1f} ms  {name}  (cumulé {cumulative / 1000:.1f} ms)")
+    failed = False
+    if forbidden:
+        print(f"ÉCHEC : modules à import paresseux chargés au démarrage : {', '.join(sorted(set(m.split('.')[0] for m in forbidden)))}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"ÉCHEC : budget de démarrage dépassé de {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
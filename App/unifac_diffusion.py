@@ -1,39 +1,52 @@
 import math
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from .unifac_params import get_store
+from .result_cache import get_result_cache
+from .metrics import timed
 
-# --- Données UNIFAC des composés (groupes + nombres) ---#
-compounds = {"Propylene": {"groups": {"CH3": 1, "CH2=CH": 1}},"Benzene": {"groups": {"ACH": 6}},"Acetaldehyde": {"groups": {"CH3": 1, "HCO": 1}},"MethylEthylamine": {"groups": {"CH3": 2, "CH2NH": 1}},
-    # Ajout de l'éthanol, du toluène et de l'eau
-"Ethanol": {"groups": {"CH3": 1, "CH2": 1, "OH": 1}},"Toluene":{"groups": {"CH3": 1, "ACH": 5, "AC": 1}},"Water": {"groups": {"OH": 1}},}
-# --- Paramètres r (volume) et q (surface) pour chaque groupe ---#
-groups = {"CH3": {"R": 0.9011, "Q": 0.848},"CH2": {"R": 0.6744, "Q": 0.540},"CH2=CH": {"R": 1.3454, "Q": 1.176},"ACH": {"R": 0.5313, "Q": 0.400},"HCO": {"R": 0.9980, "Q": 0.948},"CH2NH":  {"R": 1.2070, "Q": 0.936},
-    # Nouveaux groupes
-"OH": {"R": 0.9200, "Q": 1.4000}, "AC": {"R": 0.4000, "Q": 0.2280}, }
-
-# --- Paramètres d'interaction a_ij (K) simplifiés ---#
-interactions = {("CH3", "CH2=CH"): 986.5,("CH3", "ACH"):    476.4,("CH3", "HCO"):    663.5,("CH3", "CH2NH"):  335.8,("CH2=CH", "ACH"): 84.0,("CH2=CH", "HCO"): 199.0,("CH2=CH", "CH2NH"): 313.5,("ACH", "HCO"):    669.4,("ACH", "CH2NH"):  53.59,("HCO", "CH2NH"):  228.4,
-    # Interactions pour OH (eau)
-    ("OH", "CH3"):     1500.0,("OH", "CH2"):     1400.0,("OH", "CH2=CH"):  1300.0,("OH", "ACH"):     1700.0,("OH", "HCO"):     600.0,("OH", "CH2NH"):   500.0,
-    # Interactions pour AC (toluène)#
-    ("AC", "CH3"):     500.0,("AC", "ACH"):     200.0,}
+# --- Paramètres UNIFAC : base indexée chargée à la demande (voir unifac_params) ---#
+# compounds, groups et interactions restent accessibles comme dicts : vues construites une fois
+# par base de paramètres, puis réutilisées.
+@lru_cache(maxsize=2)
+def _legacy_views(store):
+    return {
+        'compounds': {c: {"groups": store.compound_groups(c)} for c in store.compound_names},
+        'groups': {g: {"R": float(R), "Q": float(Q)} for g, R, Q in zip(store.group_names, store.R, store.Q)},
+        'interactions': {(gi, gj): store.aij(gi, gj) for gi in store.group_names for gj in store.group_names if store.aij(gi, gj)},
+    }
+
+def __getattr__(name):
+    if name in ('compounds', 'groups', 'interactions'):
+        return _legacy_views(get_store())[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def list_available_compounds():
     """
     Retourne la liste des composés disponibles dans l'application.
     """
-    return list(compounds.keys())
+    return list(get_store().compound_names)
+
+def is_available_compound(name):
+    return get_store().has_compound(name)
 
 # Récupère le paramètre d'interaction a_ij entre deux groupes#
 def get_aij(g1, g2):
-    return interactions.get((g1, g2)) or interactions.get((g2, g1), 0.0)
+    return get_store().aij(g1, g2)
 
 # Calcule r et q d'un composé à partir de sa décomposition en groupes#
 def compute_RQ(comp):
+    store = get_store()
     r = q = 0.0
     for g, n in comp.items():
-        if g not in groups:
+        if not store.has_group(g):
             raise ValueError(f"Paramètres UNIFAC manquants pour le groupe '{g}'.")
-        r += n * groups[g]["R"]
-        q += n * groups[g]["Q"]
+        k = store.group_index[g]
+        r += n * float(store.R[k])
+        q += n * float(store.Q[k])
     return r, q
 
 # Calcule lnγ combinatoire et résiduel#
@@ -52,44 +65,284 @@ def compute_comb_and_res(x1, x2, comp1, comp2, T):
 
     # Calcul du résiduel#
     groups_mix = set(comp1) | set(comp2)
+    store = get_store()
+    Q = {g: float(store.Q[store.group_index[g]]) for g in groups_mix}
     tau = {(gi, gj): math.exp(-get_aij(gi, gj) / T) for gi in groups_mix for gj in groups_mix}
-    Q_mix = sum((comp1.get(g, 0) * x1 + comp2.get(g, 0) * x2) * groups[g]["Q"] for g in groups_mix)
-    theta_mix = {g: (comp1.get(g, 0) * x1 + comp2.get(g, 0) * x2) * groups[g]["Q"] / Q_mix for g in groups_mix}
+    Q_mix = sum((comp1.get(g, 0) * x1 + comp2.get(g, 0) * x2) * Q[g] for g in groups_mix)
+    theta_mix = {g: (comp1.get(g, 0) * x1 + comp2.get(g, 0) * x2) * Q[g] / Q_mix for g in groups_mix}
 
     def ln_gamma_res(comp):
         val = 0.0
         for g in comp:
             sum1 = sum(theta_mix[k] * tau[(k, g)] for k in groups_mix)
             sum2 = sum(theta_mix[k] * tau[(g, k)] for k in groups_mix)
-            val += comp[g] * groups[g]["Q"] * (1 - math.log(sum1) - sum2/sum1)
+            val += comp[g] * Q[g] * (1 - math.log(sum1) - sum2/sum1)
         return val
 
     return ln_gamma_comb_1 + ln_gamma_res(comp1), ln_gamma_comb_2 + ln_gamma_res(comp2)
 
-# Coefficient de diffusion selon UNIFAC#
-def unifac_diffusion(comp1_name, comp2_name, x1, T, D_exp=None):
+# --- Moteur vectorisé (NumPy) ---#
+def _check_domain(x1, T):
+    if not (np.all(np.isfinite(x1)) and np.all(np.isfinite(T))):
+        raise ValueError("La fraction molaire x1 et la température T doivent être des nombres finis.")
+    if np.any((x1 <= 0) | (x1 >= 1)):
+        raise ValueError("La fraction molaire x1 doit être strictement comprise entre 0 et 1.")
+    if np.any(T == 0):
+        raise ValueError("La température T ne peut pas être nulle.")
+
+def _check_domain_multi(x, T):
+    if not (np.all(np.isfinite(x)) and np.all(np.isfinite(T))):
+        raise ValueError("Les fractions molaires et la température doivent être des nombres finis.")
+    if np.any(x <= 0):
+        raise ValueError("Les fractions molaires doivent être strictement positives.")
+    if np.any(np.abs(x.sum(axis=-1) - 1) > 1e-9):
+        raise ValueError("La somme des fractions molaires doit être égale à 1.")
+    if np.any(T == 0):
+        raise ValueError("La température T ne peut pas être nulle.")
+
+# Taille du cache LRU des contextes de mélange (un contexte par liste de composés)#
+MIXTURE_CACHE_SIZE = int(os.getenv('UNIFAC_MIXTURE_CACHE_SIZE', 256))
+# Nombre de matrices τ(T) conservées par contexte#
+TAU_CACHE_SIZE = int(os.getenv('UNIFAC_TAU_CACHE_SIZE', 64))
+
+# --- Mode grille pour τ(T) ---#
+# τ_ij = exp(-a_ij·u) avec u = 1/T est tabulé sur une grille uniforme en u puis interpolé
+# linéairement. Sur un pas h (en u), l'erreur relative sur chaque τ_ij est bornée par
+#     (|a_ij|·h)² / 8 · exp(|a_ij|·h)
+# (erreur d'interpolation h²/8·max|f''| rapportée à min f sur l'intervalle).
+# Ex. : |a| ≤ 1700 K, T ∈ [250, 600] K, 2001 points → |a|·h ≈ 2.0e-3, erreur < 5e-7.
+# Hors de la grille, τ est calculé exactement. Format de UNIFAC_TAU_GRID : "Tmin:Tmax:points".
+_tau_grid = None
+
+def enable_tau_grid(T_min=250.0, T_max=600.0, points=2001):
     """
-    Calcule le coefficient de diffusion et, optionnellement, l'erreur relative.
-    Lève ValueError si les composés ne sont pas disponibles ou en cas de paramètres manquants.
+    Active l'interpolation de τ sur une grille de températures (voir borne d'erreur ci-dessus).
+    """
+    global _tau_grid
+    if not 0 < T_min < T_max or points < 2:
+        raise ValueError("Grille de température invalide : il faut 0 < T_min < T_max et au moins 2 points.")
+    _tau_grid = (float(T_min), float(T_max), int(points))
+
+def disable_tau_grid():
+    """
+    Revient au calcul exact de τ (avec cache par température).
+    """
+    global _tau_grid
+    _tau_grid = None
+
+def tau_grid_error_bound(a_max, T_min, T_max, points):
+    """
+    Borne de l'erreur relative sur τ en mode grille pour |a_ij| ≤ a_max.
+    """
+    ah = abs(a_max) * (1 / T_min - 1 / T_max) / (points - 1)
+    return ah ** 2 / 8 * math.exp(ah)
+
+if os.getenv('UNIFAC_TAU_GRID'):
+    enable_tau_grid(*(float(v) for v in os.getenv('UNIFAC_TAU_GRID').split(':')))
+
+class MixtureContext:
+    """
+    Données UNIFAC pré-compilées d'un mélange à C composés : index des groupes, matrice ν (C × G),
+    R et Q des groupes, r et q des composés et matrice a_ij (G × G).
+    Seule l'arithmétique dépendant de x et T reste à faire à chaque appel.
+    """
+    def __init__(self, *comps):
+        store = get_store()
+        self.group_names = tuple(dict.fromkeys(g for comp in comps for g in comp))
+        for g in self.group_names:
+            if not store.has_group(g):
+                raise ValueError(f"Paramètres UNIFAC manquants pour le groupe '{g}'.")
+        group_idx = [store.group_index[g] for g in self.group_names]
+        self.nu = np.array([[comp.get(g, 0) for g in self.group_names] for comp in comps], dtype=float)
+        self.R = store.R[group_idx]
+        self.Q = store.Q[group_idx]
+        self.a = store.a_matrix(group_idx)
+        self.r = self.nu @ self.R
+        self.q = self.nu @ self.Q
+        # Contexte partagé entre requêtes : lecture seule#
+        for arr in (self.nu, self.R, self.Q, self.a, self.r, self.q):
+            arr.flags.writeable = False
+        self._tau_cache = OrderedDict()
+        self._tau_grid = None
+        self._lock = threading.Lock()
+
+    def _tau_exact(self, T):
+        T = float(T)
+        with self._lock:
+            tau = self._tau_cache.get(T)
+            if tau is not None:
+                self._tau_cache.move_to_end(T)
+                return tau
+        tau = np.exp(-self.a / T)
+        tau.flags.writeable = False
+        with self._lock:
+            self._tau_cache[T] = tau
+            if len(self._tau_cache) > TAU_CACHE_SIZE:
+                self._tau_cache.popitem(last=False)
+        return tau
+
+    def _grid_table(self, grid):
+        # Table (points × G × G) construite une seule fois par grille#
+        table = self._tau_grid
+        if table is None or table[0] != grid:
+            T_min, T_max, points = grid
+            u = np.linspace(1 / T_max, 1 / T_min, points)
+            table = (grid, u[0], u[1] - u[0], np.exp(-u[:, None, None] * self.a))
+            self._tau_grid = table
+        return table
+
+    def tau(self, T):
+        """
+        Matrice τ (forme T.shape + (G, G)) ; aucune exponentielle pour une température unique déjà
+        vue ou, en mode grille, comprise dans la grille.
+        """
+        T = np.asarray(T, dtype=float)
+        grid = _tau_grid
+        if grid is not None and np.all((T >= grid[0]) & (T <= grid[1])):
+            _, u0, du, table = self._grid_table(grid)
+            pos = np.clip((1 / T - u0) / du, 0, len(table) - 1)
+            i = np.minimum(pos.astype(int), len(table) - 2)
+            w = (pos - i)[..., None, None]
+            return (1 - w) * table[i] + w * table[i + 1]
+        if T.ndim == 0:
+            return self._tau_exact(T)
+        if T.size and np.all(T == T.flat[0]):
+            return np.broadcast_to(self._tau_exact(T.flat[0]), T.shape + self.a.shape)
+        # Plusieurs températures : une seule exponentielle vectorisée, hors du cache LRU#
+        return np.exp(-self.a / T[..., None, None])
+
+    def ln_gamma(self, x, T):
+        """
+        Renvoie lnγ (forme (..., C)) pour des compositions x (..., C) et des températures T
+        diffusables avec x[..., 0]. Les domaines doivent avoir été vérifiés par l'appelant.
+        """
+        nu, Q, r, q = self.nu, self.Q, self.r, self.q
+
+        # Partie combinatoire#
+        phi = x * r / (x @ r)[..., None]
+        theta = x * q / (x @ q)[..., None]
+        ln_comb = (1 - phi) + np.log(phi) - 5 * q * (1 - theta / phi + np.log(theta / phi))
+
+        # Partie résiduelle : θ_mix (..., G) et τ (..., G, G)#
+        XQ = (x @ nu) * Q
+        theta_mix = XQ / XQ.sum(axis=-1, keepdims=True)
+        tau = self.tau(T)
+        sum1 = np.einsum('...k,...kg->...g', theta_mix, tau)
+        sum2 = np.einsum('...k,...gk->...g', theta_mix, tau)
+        ln_res = (Q * (1 - np.log(sum1) - sum2 / sum1)) @ nu.T
+
+        return ln_comb + ln_res
+
+    def ln_gamma_binary(self, x1, T):
+        """
+        Renvoie (lnγ1, lnγ2) d'un mélange binaire pour des tableaux x1 et T diffusables entre eux.
+        """
+        x1, T = np.asarray(x1, dtype=float), np.asarray(T, dtype=float)
+        np.broadcast_shapes(x1.shape, T.shape)
+        _check_domain(x1, T)
+        ln_g = self.ln_gamma(np.stack([x1, 1 - x1], axis=-1), T)
+        return ln_g[..., 0], ln_g[..., 1]
+
+@lru_cache(maxsize=MIXTURE_CACHE_SIZE)
+def get_mixture_context(*comp_names):
+    """
+    Contexte de mélange compilé pour une liste ordonnée de composés, conservé dans un cache LRU.
     """
-    # Validation des noms de composés #
-    if comp1_name not in compounds or comp2_name not in compounds:
+    store = get_store()
+    return MixtureContext(*(store.compound_groups(name) for name in comp_names))
+
+def mixture_cache_info():
+    """
+    Statistiques du cache des contextes de mélange (succès, échecs, taille).
+    """
+    info = get_mixture_context.cache_info()
+    lookups = info.hits + info.misses
+    return {"hits": info.hits, "misses": info.misses, "maxsize": info.maxsize,
+            "currsize": info.currsize, "hit_rate": info.hits / lookups if lookups else 0.0}
+
+def result_cache_info():
+    """
+    Statistiques du cache partagé des résultats (None s'il est désactivé).
+    """
+    cache = get_result_cache()
+    return cache.info() if cache else None
+
+def compute_comb_and_res_batch(x1, comp1, comp2, T):
+    """
+    Version vectorisée de compute_comb_and_res.
+    x1 et T sont des tableaux (ou scalaires) diffusables entre eux ; renvoie (lnγ1, lnγ2) de même forme.
+    """
+    return MixtureContext(comp1, comp2).ln_gamma_binary(x1, T)
+
+def unifac_activity(comp_names, x, T):
+    """
+    Coefficients d'activité UNIFAC d'un mélange à N composés.
+    comp_names : liste des composés ; x : fractions molaires de forme (..., N) ; T diffusable avec x[..., 0].
+    Renvoie lnγ de forme (..., N). Pour N = 2, résultats identiques à unifac_diffusion_batch.
+    """
+    unknown = [name for name in comp_names if not is_available_compound(name)]
+    if unknown:
+        raise ValueError(f"Choix invalide: {unknown} non défini(s). Options possibles: {list_available_compounds()}")
+    x, T = np.asarray(x, dtype=float), np.asarray(T, dtype=float)
+    if x.ndim == 0 or x.shape[-1] != len(comp_names):
+        raise ValueError(f"x doit avoir {len(comp_names)} fractions molaires sur son dernier axe.")
+    np.broadcast_shapes(x.shape[:-1], T.shape)
+    try:
+        _check_domain_multi(x, T)
+        return get_mixture_context(*comp_names).ln_gamma(x, T)
+    except ValueError as e:
+        raise ValueError(f"Erreur UNIFAC: {e}")
+
+def _check_compounds(comp1_name, comp2_name):
+    if not is_available_compound(comp1_name) or not is_available_compound(comp2_name):
         raise ValueError(f"Choix invalide: '{comp1_name}' ou '{comp2_name}' n'est pas défini."
                          f" Options possibles: {list_available_compounds()}")
-    x2 = 1 - x1
+
+@timed('unifac_diffusion_batch')
+def unifac_diffusion_batch(comp1_name, comp2_name, x1, T):
+    """
+    Calcule lnγ1, lnγ2 et D pour des tableaux de compositions x1 et de températures T.
+    Lève ValueError si les composés ne sont pas disponibles, en cas de paramètres manquants
+    ou si un point sort du domaine (0 < x1 < 1, T ≠ 0).
+    """
+    _check_compounds(comp1_name, comp2_name)
     try:
-        comp1 = compounds[comp1_name]["groups"]
-        comp2 = compounds[comp2_name]["groups"]
-        ln_g1, ln_g2 = compute_comb_and_res(x1, x2, comp1, comp2, T)
+        ln_g1, ln_g2 = get_mixture_context(comp1_name, comp2_name).ln_gamma_binary(x1, T)
     except ValueError as e:
         raise ValueError(f"Erreur UNIFAC: {e}")
 
+    x1 = np.asarray(x1, dtype=float)
     ln_D = (1 - x1) * ln_g1 + x1 * ln_g2
-    D = math.exp(ln_D) * 1e-6
+    D = np.exp(ln_D) * 1e-6
+    return ln_g1, ln_g2, D
+
+def relative_error_pct(D, D_exp):
+    """
+    Erreur relative (%) entre D calculé et D expérimental (scalaires ou tableaux).
+    """
+    D_exp = np.asarray(D_exp, dtype=float)
+    if np.any(D_exp == 0):
+        raise ValueError("D_exp ne peut pas être zéro pour le calcul de l'erreur")
+    return np.abs(D_exp - D) / D_exp * 100
+
+# Coefficient de diffusion selon UNIFAC#
+@timed('unifac_diffusion')
+def unifac_diffusion(comp1_name, comp2_name, x1, T, D_exp=None):
+    """
+    Calcule le coefficient de diffusion et, optionnellement, l'erreur relative.
+    Lève ValueError si les composés ne sont pas disponibles ou en cas de paramètres manquants.
+    Le résultat est d'abord cherché dans le cache partagé entre workers (result_cache, si activé).
+    """
+    cache = get_result_cache()
+    mode = 'exact' if _tau_grid is None else 'grid:%r:%r:%d' % _tau_grid
+    key = cache.key(get_store().fingerprint, mode, comp1_name, comp2_name, x1, T) if cache else None
+    D = cache.get(key) if cache else None
+    if D is None:
+        _, _, D = unifac_diffusion_batch(comp1_name, comp2_name, x1, T)
+        D = float(D)
+        if cache:
+            cache.put(key, D)
     error_pct = None
     if D_exp is not None:
-        if D_exp == 0:
-            raise ValueError("D_exp ne peut pas être zéro pour le calcul de l'erreur")
-        error_pct = abs(D_exp - D) / D_exp * 100
+        error_pct = float(relative_error_pct(D, D_exp))
     return D, error_pct
-
@@ -0,0 +1,144 @@
+import csv
+import hashlib
+import os
+import threading
+import click
+import numpy as np
+
+# --- Base de paramètres UNIFAC (sous-groupes, interactions, composés) ---#
+# Source éditable : fichiers CSV de App/data (identifiants entiers des sous-groupes et des groupes
+# principaux, comme dans les tables publiées). Forme compilée : un .npz colonnaire produit par
+# `flask build-unifac-params`, chargé paresseusement au premier usage.
+# Les a_ij sont définis entre groupes principaux ; si une seule direction (i, j) est fournie,
+# la valeur est reprise pour (j, i) (paramètres simplifiés de l'application).
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_PARAMS_PATH = os.getenv('UNIFAC_PARAMS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'unifac_params.npz'))
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def compile_csv(groups_csv=None, interactions_csv=None, compounds_csv=None):
+    """
+    Lit les fichiers CSV et renvoie les tableaux colonnaires de la base de paramètres.
+    """
+    group_rows = _read_csv(groups_csv or os.path.join(DATA_DIR, 'unifac_groups.csv'))
+    interaction_rows = _read_csv(interactions_csv or os.path.join(DATA_DIR, 'unifac_interactions.csv'))
+    compound_rows = _read_csv(compounds_csv or os.path.join(DATA_DIR, 'unifac_compounds.csv'))
+
+    group_id = np.array([int(row['subgroup_id']) for row in group_rows], dtype=np.int32)
+    main_group_id = np.array([int(row['main_group_id']) for row in group_rows], dtype=np.int32)
+    main_ids = np.unique(main_group_id)
+    main_index = {m: k for k, m in enumerate(main_ids.tolist())}
+    a = np.zeros((len(main_ids), len(main_ids)))
+    given = np.zeros(a.shape, dtype=bool)
+    for row in interaction_rows:
+        i, j = main_index[int(row['main_group_i'])], main_index[int(row['main_group_j'])]
+        a[i, j] = float(row['a_ij'])
+        given[i, j] = a[i, j] != 0
+    fill = ~given & given.T
+    a[fill] = a.T[fill]
+
+    group_index = {g: k for k, g in enumerate(group_id.tolist())}
+    compound_name = list(dict.fromkeys(row['compound'] for row in compound_rows))
+    by_compound = {name: [] for name in compound_name}
+    for row in compound_rows:
+        by_compound[row['compound']].append((group_index[int(row['subgroup_id'])], int(row['count'])))
+    entries = [entry for name in compound_name for entry in by_compound[name]]
+    return {
+        'group_id': group_id,
+        'group_name': np.array([row['name'] for row in group_rows]),
+        'main_group': np.array([main_index[m] for m in main_group_id.tolist()], dtype=np.int32),
+        'main_group_id': main_ids.astype(np.int32),
+        'R': np.array([float(row['R']) for row in group_rows]),
+        'Q': np.array([float(row['Q']) for row in group_rows]),
+        'a': a,
+        'compound_name': np.array(compound_name),
+        'compound_indptr': np.cumsum([0] + [len(by_compound[name]) for name in compound_name]).astype(np.int32),
+        'compound_group': np.array([g for g, _ in entries], dtype=np.int32),
+        'compound_count': np.array([n for _, n in entries], dtype=np.int32),
+    }
+
+class ParameterStore:
+    """
+    Paramètres UNIFAC indexés : groupes par indice entier, a_ij dense entre groupes principaux,
+    composés en format CSR (indptr / indices de groupes / nombres).
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+        self.group_names = self.group_name.tolist()
+        self.group_index = {g: k for k, g in enumerate(self.group_names)}
+        self.compound_names = self.compound_name.tolist()
+        self.compound_index = {c: k for k, c in enumerate(self.compound_names)}
+        digest = hashlib.sha256()
+        for name in sorted(arrays):
+            digest.update(name.encode())
+            digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+        self.fingerprint = digest.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or DEFAULT_PARAMS_PATH
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return cls({name: data[name] for name in data.files})
+        return cls(compile_csv())
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **self.arrays)
+        os.replace(tmp_path, path)
+
+    def has_group(self, name):
+        return name in self.group_index
+
+    def has_compound(self, name):
+        return name in self.compound_index
+
+    def aij(self, g1, g2):
+        """ a_ij entre deux sous-groupes (0.0 si inconnu) """
+        i, j = self.group_index.get(g1), self.group_index.get(g2)
+        if i is None or j is None:
+            return 0.0
+        return float(self.a[self.main_group[i], self.main_group[j]])
+
+    def a_matrix(self, group_idx):
+        """ Matrice a_ij (G × G) pour une liste d'indices de sous-groupes """
+        main = self.main_group[np.asarray(group_idx, dtype=np.int32)]
+        return self.a[np.ix_(main, main)]
+
+    def compound_groups(self, name):
+        """ Décomposition d'un composé : dict {nom de groupe: nombre} """
+        k = self.compound_index[name]
+        start, end = self.compound_indptr[k], self.compound_indptr[k + 1]
+        return {self.group_names[g]: int(n) for g, n in zip(self.compound_group[start:end], self.compound_count[start:end])}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Base de paramètres du processus, chargée au premier appel.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ParameterStore.load()
+    return _store
+
+@click.command('build-unifac-params')
+@click.option('--groups', 'groups_csv', default=None, help="CSV des sous-groupes (subgroup_id, name, main_group_id, R, Q).")
+@click.option('--interactions', 'interactions_csv', default=None, help="CSV des interactions (main_group_i, main_group_j, a_ij).")
+@click.option('--compounds', 'compounds_csv', default=None, help="CSV des composés (compound, subgroup_id, count).")
+@click.option('--output', default=None, help="Fichier .npz (défaut : UNIFAC_PARAMS_PATH ou instance/unifac_params.npz).")
+def build_params_command(groups_csv, interactions_csv, compounds_csv, output):
+    """Compile les tables UNIFAC CSV en base binaire colonnaire."""
+    output = output or DEFAULT_PARAMS_PATH
+    store = ParameterStore(compile_csv(groups_csv, interactions_csv, compounds_csv))
+    store.save(output)
+    click.echo(f"{len(store.group_names)} sous-groupes, {len(store.main_group_id)} groupes principaux, "
+               f"{len(store.compound_names)} composés écrits dans {output}")
@@ -0,0 +1,188 @@
+import json
+import math
+import os
+import threading
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+from .unifac_diffusion import is_available_compound, list_available_compounds, unifac_diffusion, unifac_diffusion_batch, relative_error_pct
+from .unifac_params import get_store
+from .metrics import timed
+
+# --- Tables D(x, T) pré-calculées, partagées entre workers par mmap ---#
+# Format du fichier : MAGIC, longueur de l'en-tête (uint64), en-tête JSON, remplissage jusqu'à
+# un multiple de 64 octets, puis ln D - s(x) en float64 de forme (paires × T × x).
+# s(x) = (1 - x)·ln x + x·ln(1 - x) est la partie singulière de ln D aux bords (termes ln φ
+# du combinatoire) : elle est retirée avant tabulation et rajoutée exactement à la lecture.
+# La grille en x est uniforme en logit(x) = ln(x / (1 - x)) : elle se resserre près des bords,
+# où la partie résiduelle varie sur des échelles de l'ordre de τ_ij.
+# Les paires sont stockées une seule fois (A, B) : D(B, A, x) = D(A, B, 1 - x).
+MAGIC = b'UNIFTAB1'
+DEFAULT_TABLE_PATH = os.getenv('UNIFAC_TABLE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'instance', 'unifac_tables.bin'))
+
+def parameters_fingerprint():
+    """
+    Empreinte des paramètres UNIFAC : une table construite avec d'autres paramètres est ignorée.
+    """
+    return get_store().fingerprint
+
+def _singular_part(x):
+    return (1 - x) * np.log(x) + x * np.log(1 - x)
+
+def _logit(x):
+    return np.log(x) - np.log1p(-x)
+
+def build_tables(path, x_min=1e-4, x_max=1 - 1e-4, x_points=999, T_min=250.0, T_max=600.0, T_points=351):
+    """
+    Tabule ln D sur la grille (x, T) pour chaque paire de composés et écrit le fichier binaire.
+    L'erreur d'interpolation est mesurée aux centres des cellules et enregistrée dans l'en-tête.
+    """
+    names = sorted(list_available_compounds())
+    pairs = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+    l = np.linspace(_logit(x_min), _logit(x_max), x_points)
+    x = 1 / (1 + np.exp(-l))
+    T = np.linspace(T_min, T_max, T_points)
+    l_mid = (l[:-1] + l[1:]) / 2
+    x_mid = 1 / (1 + np.exp(-l_mid))
+    T_mid = (T[:-1] + T[1:]) / 2
+    data = np.empty((len(pairs), T_points, x_points))
+    max_errors = {}
+    for p, (a, b) in enumerate(pairs):
+        data[p] = np.log(unifac_diffusion_batch(a, b, x[None, :], T[:, None])[2]) - _singular_part(x)
+        exact = unifac_diffusion_batch(a, b, x_mid[None, :], T_mid[:, None])[2]
+        interp = np.exp((data[p, :-1, :-1] + data[p, :-1, 1:] + data[p, 1:, :-1] + data[p, 1:, 1:]) / 4 + _singular_part(x_mid))
+        max_errors[f"{a}|{b}"] = float(np.max(np.abs(interp - exact) / exact))
+
+    header = json.dumps({
+        "pairs": pairs,
+        "x": [x_min, x_max, x_points],
+        "T": [T_min, T_max, T_points],
+        "fingerprint": parameters_fingerprint(),
+        "max_rel_error": max_errors,
+    }).encode()
+    offset = -(-(len(MAGIC) + 8 + len(header)) // 64) * 64
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        f.write(b'\0' * (offset - len(MAGIC) - 8 - len(header)))
+        f.write(data.astype('<f8').tobytes())
+    os.replace(tmp_path, path)
+    return max_errors
+
+class DiffusionTable:
+    """
+    Table D(x, T) ouverte en np.memmap (lecture seule) : les pages sont partagées par tous
+    les processus qui ouvrent le même fichier.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Fichier de tables UNIFAC invalide : {path}")
+            header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            self.header = json.loads(f.read(header_len))
+        offset = -(-(len(MAGIC) + 8 + header_len) // 64) * 64
+        self.x_min, self.x_max, self.nx = self.header["x"]
+        self.T_min, self.T_max, self.nT = self.header["T"]
+        self.l_min = _logit(self.x_min)
+        self.dl = (_logit(self.x_max) - self.l_min) / (self.nx - 1)
+        self.dT = (self.T_max - self.T_min) / (self.nT - 1)
+        self.pairs = {tuple(pair): p for p, pair in enumerate(self.header["pairs"])}
+        self.data = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=(len(self.pairs), self.nT, self.nx))
+
+    def lookup(self, comp1_name, comp2_name, x1, T):
+        """
+        D interpolé (bilinéaire en (logit x, T)) ou None si la paire ou un point sort de la table.
+        """
+        p = self.pairs.get((comp1_name, comp2_name))
+        if p is None:
+            p = self.pairs.get((comp2_name, comp1_name))
+            if p is None:
+                return None
+            x1 = 1 - np.asarray(x1, dtype=float)
+        if np.ndim(x1) == 0 and np.ndim(T) == 0:
+            return self._lookup_scalar(p, float(x1), float(T))
+        x1, T = np.broadcast_arrays(np.asarray(x1, dtype=float), np.asarray(T, dtype=float))
+        fT = (T - self.T_min) / self.dT
+        if not np.all((x1 >= self.x_min) & (x1 <= self.x_max) & (fT >= 0) & (fT <= self.nT - 1)):
+            return None
+        fx = np.clip((_logit(x1) - self.l_min) / self.dl, 0, self.nx - 1)
+        i = np.minimum(fx.astype(int), self.nx - 2)
+        j = np.minimum(fT.astype(int), self.nT - 2)
+        wx, wT = fx - i, fT - j
+        tab = self.data[p]
+        ln_D = ((1 - wT) * ((1 - wx) * tab[j, i] + wx * tab[j, i + 1])
+                + wT * ((1 - wx) * tab[j + 1, i] + wx * tab[j + 1, i + 1]))
+        return np.exp(ln_D + _singular_part(x1))
+
+    def _lookup_scalar(self, p, x1, T):
+        # Cas d'un seul point (dashboards) : arithmétique Python, sans tableaux temporaires#
+        fT = (T - self.T_min) / self.dT
+        if not (self.x_min <= x1 <= self.x_max and 0 <= fT <= self.nT - 1):
+            return None
+        fx = min(max((math.log(x1) - math.log1p(-x1) - self.l_min) / self.dl, 0.0), self.nx - 1)
+        i = min(int(fx), self.nx - 2)
+        j = min(int(fT), self.nT - 2)
+        wx, wT = fx - i, fT - j
+        tab = self.data[p]
+        ln_D = ((1 - wT) * ((1 - wx) * tab[j, i] + wx * tab[j, i + 1])
+                + wT * ((1 - wx) * tab[j + 1, i] + wx * tab[j + 1, i + 1]))
+        return math.exp(ln_D + (1 - x1) * math.log(x1) + x1 * math.log1p(-x1))
+
+_table = None
+_table_loaded = False
+_table_lock = threading.Lock()
+
+def get_table(path=None):
+    """
+    Ouvre paresseusement la table (une fois par processus) ; None si absente ou périmée.
+    """
+    global _table, _table_loaded
+    if _table_loaded and path is None:
+        return _table
+    with _table_lock:
+        if not _table_loaded or path is not None:
+            path = path or DEFAULT_TABLE_PATH
+            table = None
+            if os.path.exists(path):
+                table = DiffusionTable(path)
+                if table.header.get("fingerprint") != parameters_fingerprint():
+                    table = None
+            _table, _table_loaded = table, True
+    return _table
+
+@timed('diffusion_lookup')
+def diffusion_lookup(comp1_name, comp2_name, x1, T, D_exp=None, exact=False):
+    """
+    Même contrat que unifac_diffusion : lecture dans la table pré-calculée si possible,
+    calcul exact sinon (hors grille, paire absente, table absente ou exact=True).
+    """
+    table = None if exact else get_table()
+    D = None
+    if table is not None and is_available_compound(comp1_name) and is_available_compound(comp2_name):
+        D = table.lookup(comp1_name, comp2_name, x1, T)
+    if D is None:
+        return unifac_diffusion(comp1_name, comp2_name, x1, T, D_exp)
+    D = float(D)
+    error_pct = None
+    if D_exp is not None:
+        error_pct = float(relative_error_pct(D, D_exp))
+    return D, error_pct
+
+@click.command('build-unifac-tables')
+@click.option('--output', default=None, help="Chemin du fichier (défaut : UNIFAC_TABLE_PATH ou instance/unifac_tables.bin).")
+@click.option('--x-points', default=999, show_default=True)
+@click.option('--t-min', default=250.0, show_default=True)
+@click.option('--t-max', default=600.0, show_default=True)
+@click.option('--t-points', default=351, show_default=True)
+@with_appcontext
+def build_tables_command(output, x_points, t_min, t_max, t_points):
+    """Pré-calcule les tables D(x, T) de toutes les paires de composés."""
+    output = output or DEFAULT_TABLE_PATH
+    max_errors = build_tables(output, x_points=x_points, T_min=t_min, T_max=t_max, T_points=t_points)
+    current_app.logger.info(f"Tables UNIFAC écrites dans {output}")
+    click.echo(f"{len(max_errors)} paires tabulées dans {output}")
+    click.echo(f"Erreur relative max d'interpolation : {max(max_errors.values()):.2e}")
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import db
+from .models import Formulaire
+
+# --- Cache des utilisateurs pour Flask-Login ---#
+# Le user_loader renvoie un instantané léger (sans session SQLAlchemy) gardé USER_CACHE_TTL
+# secondes par worker, au lieu d'une requête à chaque appel authentifié. Toute modification d'un
+# Formulaire l'invalide dans le processus qui l'écrit (après flush et après commit) ; les autres
+# workers le rechargent au plus tard à l'expiration du TTL.
+# Les routes qui modifient l'utilisateur chargent la ligne réelle (db.session.get).
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+USER_CACHE_MAX = 10000
+
+class UserSnapshot(UserMixin):
+    """ Copie en lecture seule des champs de Formulaire utilisés par les vues et les gabarits """
+    def __init__(self, user):
+        self.id = user.id
+        self.email = user.email
+        self.username = user.username
+        self.is_confirmed = user.is_confirmed
+        self._active = user.is_active is not False
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        """ Instantané de l'utilisateur (None s'il n'existe pas) """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        user = db.session.get(Formulaire, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user)
+        with self._lock:
+            self._entries[user_id] = (now + USER_CACHE_TTL, snapshot)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > USER_CACHE_MAX:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
+
+@event.listens_for(Formulaire, 'after_update')
+@event.listens_for(Formulaire, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('updated_users', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    # Seconde invalidation une fois la transaction validée (lecture concurrente entre flush et commit)#
+    for user_id in session.info.pop('updated_users', ()):
+        user_cache.invalidate(user_id)
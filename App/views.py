@@ -1,12 +1,18 @@
-import re, os
-from flask import Blueprint, render_template, current_app, request
+import re, os, io, json
+import numpy as np
+from flask import Blueprint, render_template, current_app, request, jsonify, Response, stream_with_context, send_file
 from flask_login import login_required, current_user
-from .unifac_diffusion import unifac_diffusion
+from .unifac_diffusion import unifac_diffusion_batch, is_available_compound
+from .unifac_tables import diffusion_lookup
+from .batch import run_batch, results_to_csv, record_results
+from .exports import parse_export_filters, stream_history, history_count, EXPORT_FORMATS
+from .pdf_export import parse_export_params, cached_pdf, export_to_cache, PDF_SYNC_MAX_ROWS
+from .jobs import submit_job, job_accepted
+from .history import history
 from .models import Calculation
 from flask import make_response
 from . import db
 from .Dic import compound_translations
-from weasyprint import HTML
 from datetime import datetime
 
 
@@ -44,11 +50,9 @@ def dashboard_fr():
             compound_B_english = translate_to_english(compound_B, 'fr')
             if compound_A_english is None or compound_B_english is None:
                 raise ValueError("Composé inconnu ou traduction non trouvée")
-            D_AB, error = unifac_diffusion(compound_A_english, compound_B_english, x_A, T, D_exp)
+            D_AB, error = diffusion_lookup(compound_A_english, compound_B_english, x_A, T, D_exp, exact=bool(request.form.get('exact')))
             result = {'D_AB': round(D_AB, 6), 'error': round(error, 2)}
-            new_calc = Calculation(user_id=current_user.id, compound_A=compound_A, compound_B=compound_B, x_A=x_A, T=T, D_exp=D_exp, D_calc=D_AB, error=error)
-            db.session.add(new_calc)
-            db.session.commit()
+            history.record(current_user.id, compound_A, compound_B, x_A, T, D_exp, D_AB, error)
             return render_template("FR/Dashboard_fr.html", user=current_user, result=result, compounds=compounds)
         except Exception as e:
             return render_template("FR/Dashboard_fr.html", user=current_user, error_message=str(e), compounds=compounds)
@@ -78,11 +82,9 @@ def dashboard_en():
             compound_B_english = translate_to_english(compound_B, 'en')
             if compound_A_english is None or compound_B_english is None:
                 raise ValueError("Unknown compound or translation not found")
-            D_AB, error = unifac_diffusion(compound_A_english, compound_B_english, x_A, T, D_exp)
+            D_AB, error = diffusion_lookup(compound_A_english, compound_B_english, x_A, T, D_exp, exact=bool(request.form.get('exact')))
             result = {'D_AB': round(D_AB, 6), 'error': round(error, 2)}
-            new_calc = Calculation(user_id=current_user.id, compound_A=compound_A, compound_B=compound_B, x_A=x_A, T=T, D_exp=D_exp, D_calc=D_AB, error=error)
-            db.session.add(new_calc)
-            db.session.commit()
+            history.record(current_user.id, compound_A, compound_B, x_A, T, D_exp, D_AB, error)
             return render_template("EN/Dashboard_en.html", user=current_user, result=result, compounds=compounds)
         except Exception as e:
             return render_template("EN/Dashboard_en.html", user=current_user, error_message=str(e), compounds=compounds)
@@ -112,53 +114,240 @@ def dashboard_ar():
             compound_B_english = translate_to_english(compound_B, 'ar')
             if compound_A_english is None or compound_B_english is None:
                 raise ValueError("مركب غير معروف أو الترجمة غير موجودة")
-            D_AB, error = unifac_diffusion(compound_A_english, compound_B_english, x_A, T, D_exp)
+            D_AB, error = diffusion_lookup(compound_A_english, compound_B_english, x_A, T, D_exp, exact=bool(request.form.get('exact')))
             result = {'D_AB': round(D_AB, 6), 'error': round(error, 2)}
-            new_calc = Calculation(user_id=current_user.id, compound_A=compound_A, compound_B=compound_B, x_A=x_A, T=T, D_exp=D_exp, D_calc=D_AB, error=error)
-            db.session.add(new_calc)
-            db.session.commit()
+            history.record(current_user.id, compound_A, compound_B, x_A, T, D_exp, D_AB, error)
             return render_template("AR/Dashboard_ar.html", user=current_user, result=result, compounds=compounds)
         except Exception as e:
             return render_template("AR/Dashboard_ar.html", user=current_user, error_message=str(e), compounds=compounds)  
     return render_template("AR/Dashboard_ar.html", user=current_user, compounds=compounds)
 #....................Historiques Calcul.....................#
+# Pagination par curseur (keyset) : on repart du dernier (timestamp, id) affiché au lieu d'un
+# OFFSET, ce qui reste en temps constant grâce à l'index (user_id, timestamp).
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 500
+HISTORY_JSON_COLUMNS = ('id', 'timestamp', 'compound_A', 'compound_B', 'x_A', 'T', 'D_exp', 'D_calc', 'error')
+
+# Ordre : date décroissante, calculs sans date (NULL, autorisés par le schéma) en dernier, puis id#
+HISTORY_ORDER = (Calculation.timestamp.desc().nulls_last(), Calculation.id.desc())
+
+def _encode_cursor(row):
+    return f"{row.timestamp.isoformat() if row.timestamp else 'null'}_{row.id}"
+
+def _decode_cursor(cursor):
+    try:
+        timestamp, row_id = cursor.rsplit('_', 1)
+        return (None if timestamp == 'null' else datetime.fromisoformat(timestamp)), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def history_page(user_id, cursor=None, limit=HISTORY_PAGE_SIZE, columns=None):
+    """
+    Une page de l'historique (du plus récent au plus ancien) et le curseur de la page suivante
+    (None s'il n'y en a pas). `columns` : noms de colonnes pour ne charger que celles-ci.
+    """
+    if columns:
+        query = db.session.query(*(getattr(Calculation, c) for c in columns))
+    else:
+        query = Calculation.query
+    query = query.filter(Calculation.user_id == user_id)
+    position = _decode_cursor(cursor) if cursor else None
+    if position:
+        timestamp, row_id = position
+        if timestamp is None:
+            query = query.filter(Calculation.timestamp.is_(None), Calculation.id < row_id)
+        else:
+            query = query.filter(db.or_(Calculation.timestamp < timestamp,
+                                        db.and_(Calculation.timestamp == timestamp, Calculation.id < row_id),
+                                        Calculation.timestamp.is_(None)))
+    rows = query.order_by(*HISTORY_ORDER).limit(limit + 1).all()
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def _render_history(template):
+    cursor = request.args.get('cursor')
+    user_calculations, next_cursor = history_page(current_user.id, cursor)
+    if not cursor:
+        # Les calculs encore dans le tampon d'écriture n'apparaissent qu'en première page#
+        user_calculations = history.pending_for_user(current_user.id) + user_calculations
+    return render_template(template, user=current_user, calculations=user_calculations,
+                           cursor=cursor, next_cursor=next_cursor)
+
 @views.route('/calculs_history_fr')
 @login_required
 def calculshistory_fr():
-    from .models import Calculation
-    user_calculations = Calculation.query.filter_by(user_id=current_user.id).order_by(Calculation.timestamp.desc()).all()
-    return render_template("FR/Calculations_History.html", user=current_user, calculations=user_calculations)
+    return _render_history("FR/Calculations_History.html")
 @views.route('/calculs_history_en')
 @login_required
 def calculshistory_en():
-    from .models import Calculation
-    user_calculations = Calculation.query.filter_by(user_id=current_user.id).order_by(Calculation.timestamp.desc()).all()
-    return render_template("EN/Calculations_History.html", user=current_user, calculations=user_calculations)
+    return _render_history("EN/Calculations_History.html")
 @views.route('/calculs_history_ar')
 @login_required
 def calculshistory_ar():
-    from .models import Calculation
-    user_calculations = Calculation.query.filter_by(user_id=current_user.id).order_by(Calculation.timestamp.desc()).all()
-    return render_template("AR/Calculations_History.html", user=current_user, calculations=user_calculations)
+    return _render_history("AR/Calculations_History.html")
+@views.route('/calculs_history.json')
+@login_required
+def calculshistory_json():
+    """ Historique en JSON pour le défilement infini : ?cursor=...&limit=... """
+    cursor = request.args.get('cursor')
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_PAGE_MAX)
+    rows, next_cursor = history_page(current_user.id, cursor, limit, columns=HISTORY_JSON_COLUMNS)
+    calculations = [dict(zip(HISTORY_JSON_COLUMNS, row)) for row in rows]
+    if not cursor:
+        pending = [{c: getattr(row, c) for c in HISTORY_JSON_COLUMNS} for row in history.pending_for_user(current_user.id)]
+        calculations = pending + calculations
+    for calc in calculations:
+        calc['timestamp'] = calc['timestamp'].isoformat() if calc['timestamp'] else None
+    return jsonify({'calculations': calculations, 'next_cursor': next_cursor})
 #....................Export/pdf.....................#
 @views.route('/export_pdf')
 @login_required
 def export_pdf():
-    calculations = Calculation.query.filter_by(user_id=current_user.id)\
-                                     .order_by(Calculation.timestamp.desc())\
-                                     .all()
-    html = render_template(
-      "pdf.html",
-      user=current_user,
-      calculations=calculations,
-      now=datetime.now()
-    )
-    pdf = HTML(string=html).write_pdf()
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] =\
-        'attachment; filename=historique_diffusion.pdf'
+    """
+    PDF de l'historique : ?date_from=&date_to=&limit=&renderer=weasyprint|reportlab&async=1.
+    Servi depuis le cache s'il est à jour ; sinon généré ici pour les petits historiques,
+    en tâche de fond au-delà de PDF_SYNC_MAX_ROWS lignes (réponse 202).
+    """
+    history.flush()
+    try:
+        params = parse_export_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    path = cached_pdf(current_user.id, params)
+    if path is None:
+        if request.args.get('async') or history_count(current_user.id, params) > PDF_SYNC_MAX_ROWS:
+            return job_accepted(submit_job('export_pdf', current_user.id, params))
+        path = export_to_cache(current_user.id, params)
+    return send_file(path, mimetype='application/pdf', as_attachment=True, download_name='historique_diffusion.pdf')
+#....................Export CSV / NDJSON.....................#
+@views.route('/export_history')
+@login_required
+def export_history():
+    """
+    Export en flux de l'historique : ?format=csv|ndjson&compress=gzip et filtres
+    compound_A, compound_B, T_min, T_max, date_from, date_to, limit.
+    """
+    history.flush()
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Format inconnu : {fmt}"}), 400
+    try:
+        filters = parse_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    compress = request.args.get('compress') == 'gzip'
+    filename = f"historique_diffusion.{fmt}" + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    response = Response(stream_with_context(stream_history(current_user.id, filters, fmt, compress)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
+#....................Balayage en composition D(x).....................#
+SWEEP_MAX_POINTS = 100000
+SWEEP_NDJSON_THRESHOLD = 5000  # au-delà, la réponse est streamée en NDJSON
+
+def resolve_compound(name, language='en'):
+    """ Accepte le nom technique (anglais) ou le nom affiché dans la langue donnée """
+    if is_available_compound(name):
+        return name
+    return translate_to_english(name, language)
+
+def _parse_sweep_x(data):
+    # Liste explicite : JSON [..], "0.1,0.2" ou paramètre x répété#
+    x = ','.join(data.getlist('x')) or None if hasattr(data, 'getlist') else data.get('x')
+    if x is not None:
+        if isinstance(x, str):
+            x = x.split(',')
+        elif not isinstance(x, (list, tuple)):
+            x = [x]
+        return np.array([float(v) for v in x])
+    x_min = float(data.get('x_min', 0.01))
+    x_max = float(data.get('x_max', 0.99))
+    points = int(data.get('points', 99))
+    if points < 1:
+        raise ValueError("Le nombre de points doit être positif.")
+    if points > SWEEP_MAX_POINTS:
+        raise ValueError(f"Trop de points demandés (maximum {SWEEP_MAX_POINTS}).")
+    return np.linspace(x_min, x_max, points)
+
+@views.route('/diffusion_sweep', methods=['GET', 'POST'])
+@login_required
+def diffusion_sweep():
+    """
+    Courbe D(x_A) complète pour un couple et une température en un seul calcul vectorisé.
+    Paramètres : compound_A, compound_B, T, lang, puis soit x (liste), soit x_min/x_max/points ;
+    format=json (défaut) ou ndjson (automatique au-delà de SWEEP_NDJSON_THRESHOLD points).
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.values
+    elif not isinstance(data, dict):
+        return jsonify({'error': "Corps JSON invalide : objet attendu"}), 400
+    try:
+        lang = data.get('lang', 'en')
+        fmt = data.get('format') or None
+        if fmt not in (None, 'json', 'ndjson'):
+            raise ValueError(f"Format inconnu : {fmt} (json ou ndjson)")
+        compound_A = resolve_compound(data['compound_A'], lang)
+        compound_B = resolve_compound(data['compound_B'], lang)
+        if compound_A is None or compound_B is None:
+            raise ValueError("Composé inconnu ou traduction non trouvée")
+        T = float(data['T'])
+        x = _parse_sweep_x(data)
+        if len(x) > SWEEP_MAX_POINTS:
+            raise ValueError(f"Trop de points demandés (maximum {SWEEP_MAX_POINTS}).")
+        ln_g1, ln_g2, D = unifac_diffusion_batch(compound_A, compound_B, x, T)
+    except KeyError as e:
+        return jsonify({'error': f"Paramètre manquant : {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except TypeError:
+        return jsonify({'error': "Paramètre invalide : composés textuels et valeurs numériques attendus"}), 400
+
+    fmt = fmt or ('ndjson' if len(x) > SWEEP_NDJSON_THRESHOLD else 'json')
+    if fmt == 'ndjson':
+        def generate():
+            yield json.dumps({'compound_A': compound_A, 'compound_B': compound_B, 'T': T, 'points': len(x)}) + "\n"
+            for i in range(0, len(x), 1000):
+                rows = zip(x[i:i + 1000].tolist(), D[i:i + 1000].tolist(), ln_g1[i:i + 1000].tolist(), ln_g2[i:i + 1000].tolist())
+                yield "".join(json.dumps({'x_A': xa, 'D_AB': d, 'ln_gamma_A': g1, 'ln_gamma_B': g2}) + "\n"
+                              for xa, d, g1, g2 in rows)
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    return jsonify({'compound_A': compound_A, 'compound_B': compound_B, 'T': T,
+                    'x_A': x.tolist(), 'D_AB': D.tolist(),
+                    'ln_gamma_A': ln_g1.tolist(), 'ln_gamma_B': ln_g2.tolist()})
+#....................Calcul en lot (CSV).....................#
+BATCH_SYNC_MAX_BYTES = 1024 * 1024  # au-delà, le calcul passe en tâche de fond
+
+@views.route('/batch_csv', methods=['POST'])
+@login_required
+def batch_csv():
+    """
+    Import d'un CSV (compound_A, compound_B, x_A, T, D_exp) et renvoi d'un CSV de résultats
+    avec D_calc, error_pct et un statut par ligne (persist=1 : lignes valides ajoutées à
+    l'historique). Les gros fichiers (ou async=1) sont traités
+    en tâche de fond : réponse 202 avec l'URL de suivi de la tâche.
+    """
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'Fichier CSV manquant'}), 400
+    lang = request.form.get('lang', 'en')
+    persist = bool(request.form.get('persist'))
+    if request.form.get('async') or (request.content_length or 0) > BATCH_SYNC_MAX_BYTES:
+        job_id = submit_job('batch_csv', current_user.id, {'lang': lang, 'persist': persist}, input_file=upload.stream)
+        return job_accepted(job_id)
+    try:
+        results = run_batch(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''), lang)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if persist:
+        record_results(current_user.id, results, lang)
+    n_ok = sum(1 for r in results if r['status'] == 'ok')
+    response = Response(stream_with_context(results_to_csv(results)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=resultats_diffusion.csv'
+    response.headers['X-Rows-Ok'] = str(n_ok)
+    response.headers['X-Rows-Error'] = str(len(results) - n_ok)
+    return response
+
 #..................translate...........................#
 def translate_to_english(compound_name, language='en'):
     inverse_translations = {"fr": {v["fr"]: k for k, v in compound_translations.items()}, "ar": {v["ar"]: k for k, v in compound_translations.items()},"en": {v["en"]: k for k, v in compound_translations.items()},}
@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# --- Banc d'essai du moteur UNIFAC et des chemins web critiques ---#
+# Usage : python -m benchmarks.run [--quick] [--only motif] [--output resultats.json]
+#         python -m benchmarks.run --save-baseline      (enregistre la référence)
+#         python -m benchmarks.run --check              (CI : échoue aussi sans référence)
+# Chaque cas est mesuré `repeat` fois sur `number` appels ; on retient la médiane (ms par appel).
+# Les résultats sont comparés à benchmarks/baseline.json : un cas plus lent que la référence
+# au-delà de la tolérance (25 % par défaut) fait échouer la commande (code de sortie 1) ; avec
+# --check, une référence absente ou un cas mesuré absent de la référence échoue également.
+# Les cas sensibles au cache de résultats UNIFAC (result_cache) sont mesurés cache désactivé et
+# activé (succès et échecs).
+# La référence dépend de la machine : l'enregistrer sur l'hôte (ou l'image) de déploiement.
+# L'application tourne sur une base SQLite temporaire ; les répertoires d'état (jobs, cache PDF,
+# métriques, cache de résultats, seaux de connexion) sont redirigés vers un dossier temporaire.
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_TOLERANCE = 0.25
+HISTORY_SIZES = (1000, 10000, 100000)
+PDF_SIZES = (100, 1000, 5000)
+CHAT_MESSAGES = {'fr': "Comment calculer le coefficient de diffusion ?", 'en': "How do I compute the diffusion coefficient?",
+                 'ar': "كيف أحسب معامل الانتشار؟"}
+
+def _prepare_environment(workdir):
+    # À faire avant tout import de App : les constantes de configuration sont lues à l'import#
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.sqlite3')
+    for name, sub in (('JOBS_DIR', 'jobs'), ('PDF_CACHE_DIR', 'pdf_cache'), ('METRICS_DIR', 'metrics')):
+        os.environ[name] = os.path.join(workdir, sub)
+    os.environ['UNIFAC_RESULT_CACHE_PATH'] = os.path.join(workdir, 'unifac_results.sqlite3')
+    os.environ['LOGIN_THROTTLE_PATH'] = os.path.join(workdir, 'login_throttle.sqlite3')
+    os.environ['HASH_WORKERS'] = '0'
+
+def set_result_cache(enabled):
+    """ Active ou désactive le cache de résultats UNIFAC (cache vidé) """
+    from App import result_cache
+    result_cache.RESULT_CACHE_ENABLED = enabled
+    result_cache._cache = None
+    if enabled:
+        result_cache.get_result_cache().clear()
+
+def measure(fn, number=1, repeat=5, warmup=1):
+    """ Temps par appel (ms) : médiane et minimum sur `repeat` séries de `number` appels """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number * 1000)
+    return {'median_ms': statistics.median(timings), 'min_ms': min(timings), 'number': number, 'repeat': repeat}
+
+class Suite:
+    """
+    Application de test, utilisateurs et historiques générés, et résultats des cas mesurés.
+    """
+    def __init__(self, quick=False, only=None):
+        from App import create_app, db
+        from App.models import Formulaire
+        self.quick = quick
+        self.only = only
+        self.results = {}
+        self.skipped = {}
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.db = db
+        with self.app.app_context():
+            db.create_all()
+            self.users = {}
+            for size in (0, *self.history_sizes):
+                user = Formulaire(email=f"bench{size}@example.com", username=f"bench{size}", is_confirmed=True)
+                user.set_password('Bench-pass1!')
+                db.session.add(user)
+                db.session.flush()
+                self.users[size] = user.id
+            db.session.commit()
+
+    @property
+    def history_sizes(self):
+        return HISTORY_SIZES[:2] if self.quick else HISTORY_SIZES
+
+    def wanted(self, name):
+        return self.only is None or any(pattern in name for pattern in self.only)
+
+    def case(self, name, fn, number=1, repeat=5):
+        if not self.wanted(name):
+            return
+        self.results[name] = measure(fn, number=number, repeat=repeat)
+        print(f"  {name:<45} {self.results[name]['median_ms']:10.3f} ms")
+
+    def skip(self, name, reason):
+        if self.wanted(name):
+            self.skipped[name] = reason
+            print(f"  {name:<45} ignoré : {reason}")
+
+    def client(self, user_id):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    def fill_history(self):
+        # Insertion directe par paquets : seules les lectures sont mesurées#
+        from App.models import Calculation
+        from App.unifac_diffusion import list_available_compounds
+        names = list_available_compounds()
+        start = datetime(2024, 1, 1)
+        with self.app.app_context():
+            for size in self.history_sizes:
+                for offset in range(0, size, 10000):
+                    rows = [{'user_id': self.users[size], 'compound_A': names[i % len(names)],
+                             'compound_B': names[(i + 1) % len(names)], 'x_A': 0.05 + (i % 90) / 100,
+                             'T': 280.0 + i % 100, 'D_exp': 1.2e-9, 'D_calc': 1.1e-9, 'error': 0.08,
+                             'timestamp': start + timedelta(minutes=i)}
+                            for i in range(offset, min(size, offset + 10000))]
+                    self.db.session.execute(Calculation.__table__.insert(), rows)
+            self.db.session.commit()
+
+def bench_engine(suite):
+    import numpy as np
+    from App.unifac_diffusion import list_available_compounds, unifac_diffusion, unifac_diffusion_batch
+    names = list_available_compounds()
+    pairs = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+
+    def scalar():
+        for a, b in pairs:
+            unifac_diffusion(a, b, 0.3, 310.0)
+
+    x = np.linspace(0.01, 0.99, 1000)
+    T = np.linspace(280.0, 380.0, 1000)
+
+    def batch():
+        for a, b in pairs:
+            unifac_diffusion_batch(a, b, x, T)
+
+    counter = iter(range(10 ** 9))
+
+    def scalar_new_points():
+        # Point différent à chaque appel : échec du cache puis insertion#
+        x1 = 0.05 + (next(counter) % 900_000) / 1_000_000
+        for a, b in pairs:
+            unifac_diffusion(a, b, x1, 310.0)
+
+    print(f"Moteur UNIFAC ({len(pairs)} paires)")
+    set_result_cache(False)
+    suite.case('engine.scalar_all_pairs_cache_off', scalar, number=20)
+    set_result_cache(True)
+    suite.case('engine.scalar_all_pairs_cache_hit', scalar, number=20)
+    suite.case('engine.scalar_all_pairs_cache_miss', scalar_new_points, number=20)
+    set_result_cache(False)
+    suite.case('engine.batch_all_pairs_1000_points', batch, number=3)
+
+def bench_dashboard(suite):
+    from App.Dic import compound_translations
+    client = suite.client(suite.users[0])
+    form = {'compound_A': compound_translations['Ethanol']['fr'], 'compound_B': compound_translations['Water']['fr'],
+            'x_A': '0,3', 'T': '310', 'D_exp': '1.2e-9'}
+
+    def post(data):
+        response = client.post('/dashboard_fr', data=data)
+        assert response.status_code == 200, response.status_code
+
+    print("Tableau de bord (POST)")
+    for enabled, suffix in ((False, 'cache_off'), (True, 'cache_on')):
+        set_result_cache(enabled)
+        suite.case(f'web.dashboard_post_{suffix}', lambda: post(form), number=20)
+        suite.case(f'web.dashboard_post_exact_{suffix}', lambda: post({**form, 'exact': '1'}), number=20)
+    set_result_cache(False)
+
+def bench_history(suite):
+    print("Historique")
+    for size in suite.history_sizes:
+        client = suite.client(suite.users[size])
+        first = client.get('/calculs_history.json?limit=50').get_json()
+
+        def page(url):
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+
+        suite.case(f'web.history_page_{size}', lambda: page('/calculs_history_fr'), number=10)
+        suite.case(f'web.history_json_next_page_{size}',
+                   lambda: page(f"/calculs_history.json?limit=50&cursor={first['next_cursor']}"), number=10)
+
+def _available_renderers():
+    from App.pdf_export import PDF_RENDERERS
+    available = []
+    for renderer in PDF_RENDERERS:
+        try:
+            __import__(renderer)
+            available.append(renderer)
+        except ImportError:
+            pass
+    return available
+
+def bench_pdf(suite):
+    from App.pdf_export import parse_export_params, render_pdf
+    print("Export PDF")
+    available = _available_renderers()
+    user_id = suite.users[max(suite.history_sizes)]
+    sizes = PDF_SIZES[:2] if suite.quick else PDF_SIZES
+    path = os.path.join(os.environ['PDF_CACHE_DIR'], 'bench.pdf')
+    for renderer in ('weasyprint', 'reportlab'):
+        for size in sizes:
+            name = f'pdf.{renderer}_{size}'
+            if renderer not in available:
+                suite.skip(name, f"{renderer} n'est pas installé")
+                continue
+            params = parse_export_params({'renderer': renderer, 'limit': str(size)})
+
+            def export():
+                with suite.app.test_request_context():
+                    render_pdf(user_id, params, path)
+
+            suite.case(name, export, repeat=3)
+
+def bench_chatbot(suite):
+    from App import chatbot_bot
+    print("Chatbot")
+    client = suite.app.test_client()
+    for lang, message in CHAT_MESSAGES.items():
+        try:
+            ready = chatbot_bot.get_index(lang) is not None or chatbot_bot.get_bot() is not None
+        except Exception as e:
+            ready, reason = False, str(e)
+        else:
+            reason = "aucune base entraînée (flask train-chatbot)"
+        if not ready:
+            suite.skip(f'chatbot.answer_{lang}', reason)
+            suite.skip(f'chatbot.api_{lang}', reason)
+            continue
+        counter = iter(range(10 ** 9))
+
+        def cold():
+            # Question différente à chaque appel : le cache LRU n'est pas utilisé#
+            chatbot_bot.answer_message(f"{message} {next(counter)}", lang)
+
+        def api():
+            response = client.post('/api/chatbot', json={'message': message, 'lang': lang})
+            assert response.status_code == 200, response.status_code
+
+        suite.case(f'chatbot.answer_{lang}', cold, number=20)
+        suite.case(f'chatbot.api_{lang}', api, number=20)
+
+BENCHMARKS = (bench_engine, bench_dashboard, bench_history, bench_pdf, bench_chatbot)
+
+def compare(results, baseline, tolerance, strict=False):
+    """
+    Cas plus lents que la référence au-delà de la tolérance : [(nom, référence, mesure, rapport)].
+    En mode strict, un cas absent de la référence compte comme régression (référence None).
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            if strict:
+                regressions.append((name, None, result['median_ms'], None))
+            continue
+        ratio = result['median_ms'] / reference['median_ms'] if reference['median_ms'] else float('inf')
+        if ratio > 1 + tolerance:
+            regressions.append((name, reference['median_ms'], result['median_ms'], ratio))
+    return regressions
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai du moteur UNIFAC et des routes principales.")
+    parser.add_argument('--output', help="Fichier JSON des résultats (défaut : sortie standard uniquement).")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Enregistre les résultats comme nouvelle référence.")
+    parser.add_argument('--check', action='store_true',
+                        help="Mode CI : échoue si la référence est absente ou ne couvre pas un cas mesuré.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Ralentissement toléré (0.25 = 25 %%).")
+    parser.add_argument('--only', action='append', help="Ne mesure que les cas dont le nom contient ce motif (répétable).")
+    parser.add_argument('--quick', action='store_true', help="Tailles réduites (sans l'historique de 100k lignes).")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='calcdiff-bench-') as workdir:
+        _prepare_environment(workdir)
+        suite = Suite(quick=args.quick, only=args.only)
+        suite.fill_history()
+        with suite.app.app_context():
+            for bench in BENCHMARKS:
+                bench(suite)
+        from App.history import history
+        history.flush()
+
+    report = {
+        'meta': {'date': datetime.now().isoformat(timespec='seconds'), 'commit': _git_commit(),
+                 'python': platform.python_version(), 'platform': platform.platform(), 'quick': args.quick},
+        'results': suite.results,
+        'skipped': suite.skipped,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Pas de référence ({args.baseline}) : lancer avec --save-baseline pour en créer une.")
+        return 1 if args.check else 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = compare(suite.results, baseline, args.tolerance, strict=args.check)
+    for name, reference, measured, ratio in regressions:
+        if reference is None:
+            print(f"ÉCHEC : {name} ({measured:.3f} ms) absent de la référence")
+        else:
+            print(f"RÉGRESSION : {name} {reference:.3f} ms → {measured:.3f} ms (x{ratio:.2f})")
+    if regressions:
+        return 1
+    print(f"Aucune régression au-delà de {args.tolerance:.0%} par rapport à {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import gc
+import os
+
+# --- Profil gunicorn : chargement de l'application dans le maître puis fork des workers ---#
+# L'état en lecture seule (paramètres UNIFAC, table pré-calculée, index du chatbot, gabarits)
+# est construit une fois dans le maître et partagé en copie sur écriture. Les ressources qui ne
+# survivent pas au fork (connexions à la base) sont recréées dans chaque worker ; les threads
+# et pools des composants (historique, e-mails, tâches, chatbot, hachage) démarrent par processus,
+# à leur premier usage.
+# Chaque worker a donc ses threads et jusqu'à HASH_WORKERS processus de hachage : le nombre de
+# workers reste faible par défaut (WEB_CONCURRENCY, 2) plutôt que 2 × CPU + 1.
+# Usage : gunicorn -c gunicorn.conf.py App.wsgi:app
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+def when_ready(server):
+    # Appelé dans le maître, application chargée, avant le premier fork#
+    from App import warm_up
+    from App.wsgi import app
+    warm_up(app)
+    # Objets existants exclus du ramasse-miettes : évite de recopier leurs pages dans les workers#
+    gc.freeze()
+    server.log.info("État partagé préchargé dans le maître")
+
+def post_fork(server, worker):
+    # Le pool de connexions hérité du maître n'est pas réutilisé (close=False : ne pas fermer celles du parent)#
+    from App import db
+    from App.wsgi import app
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def worker_exit(server, worker):
+    # Écritures différées encore en mémoire : historique des calculs et e-mails#
+    from App.history import history
+    from App.mailer import mailer
+    history.flush()
+    mailer.flush()
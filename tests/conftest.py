@@ -0,0 +1,120 @@
+import os
+import socket
+import sys
+import tempfile
+import pytest
+
+# --- Configuration commune des tests ---#
+# Les constantes de configuration de App sont lues à l'import : tout l'état (base SQLite, jobs,
+# caches, métriques, seaux de connexion) est redirigé vers un dossier temporaire avant l'import.
+# Aucun thread de tâches de fond (JOB_WORKERS=0) : les tests exécutent la file explicitement.
+TEST_DIR = tempfile.mkdtemp(prefix='calcdiff-tests-')
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+SMTP_PORT = _free_port()
+TEST_ENV = {
+    'SECRET_KEY': 'tests',
+    'DATABASE_URL': 'sqlite:///' + os.path.join(TEST_DIR, 'app.sqlite3'),
+    'JOBS_DIR': os.path.join(TEST_DIR, 'jobs'),
+    'PDF_CACHE_DIR': os.path.join(TEST_DIR, 'pdf_cache'),
+    'METRICS_DIR': os.path.join(TEST_DIR, 'metrics'),
+    'CHATBOT_DIR': os.path.join(TEST_DIR, 'chatbot'),
+    'UNIFAC_RESULT_CACHE_PATH': os.path.join(TEST_DIR, 'unifac_results.sqlite3'),
+    'LOGIN_THROTTLE_PATH': os.path.join(TEST_DIR, 'login_throttle.sqlite3'),
+    'HASH_WORKERS': '0',
+    'JOB_WORKERS': '0',
+    'MAIL_SERVER': '127.0.0.1',
+    'MAIL_PORT': str(SMTP_PORT),
+    'MAIL_DEFAULT_SENDER': 'noreply@example.com',
+}
+os.environ.update(TEST_ENV)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_EMAIL = 'user@example.com'
+USER_PASSWORD = 'Test-pass1!'
+
+@pytest.fixture(scope='session')
+def app():
+    from App import create_app, db
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    return app
+
+@pytest.fixture
+def user(app):
+    """ Utilisateur confirmé, recréé pour chaque test """
+    from App import db
+    from App.models import Formulaire
+    from App.security import login_throttle
+    login_throttle.clear()
+    with app.app_context():
+        Formulaire.query.filter_by(email=USER_EMAIL).delete()
+        user = Formulaire(email=USER_EMAIL, username='user', is_confirmed=True)
+        user.set_password(USER_PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+@pytest.fixture
+def client(app, user):
+    """ Client de test connecté """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user)
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture
+def api_headers(app, user):
+    """ En-tête d'authentification par jeton API """
+    from App import db
+    from App.api import generate_api_token
+    from App.models import Formulaire
+    with app.test_request_context():
+        token = generate_api_token(db.session.get(Formulaire, user))
+    return {'Authorization': f"Bearer {token}"}
+
+class StandInSMTP:
+    """
+    Serveur SMTP local (aiosmtpd) sur MAIL_PORT : garde les messages reçus et refuse les
+    destinataires de `refused` (550), comme un vrai serveur.
+    """
+    def __init__(self):
+        self.messages = []
+        self.refused = set()
+        self.controller = None
+
+    def start(self):
+        # Un Controller aiosmtpd ne redémarre pas : on en crée un à chaque démarrage#
+        from aiosmtpd.controller import Controller
+        self.controller = Controller(self, hostname='127.0.0.1', port=SMTP_PORT)
+        self.controller.start()
+
+    def stop(self):
+        if self.controller is not None:
+            self.controller.stop()
+            self.controller = None
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused:
+            return '550 Destinataire refusé'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        # session.peer identifie la connexion SMTP qui a transmis le message#
+        self.messages.append((session.peer, list(envelope.rcpt_tos), envelope.content.decode('utf-8', 'replace')))
+        return '250 Message accepté'
+
+@pytest.fixture
+def smtp_server():
+    server = StandInSMTP()
+    server.start()
+    yield server
+    server.stop()
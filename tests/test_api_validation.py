@@ -0,0 +1,25 @@
+import pytest
+
+POINT = {'compound_A': 'Ethanol', 'compound_B': 'Water', 'x_A': 0.3, 'T': 310}
+
+INVALID_POINTS = [
+    {**POINT, 'compound_A': ['Ethanol']},
+    {**POINT, 'compound_B': {'name': 'Water'}},
+    {**POINT, 'x_A': 'nan'},
+    {**POINT, 'T': 'inf'},
+    {**POINT, 'T': None},
+]
+
+@pytest.mark.parametrize('point', INVALID_POINTS)
+def test_invalid_point_returns_400(app, api_headers, point):
+    response = app.test_client().post('/api/v1/diffusion', json=point, headers=api_headers)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_batch_reports_invalid_points_individually(app, api_headers):
+    response = app.test_client().post('/api/v1/diffusion/batch', json={'points': [POINT, *INVALID_POINTS]},
+                                      headers=api_headers)
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['status'] == 'ok' and results[0]['D_calc'] > 0
+    assert all(row['status'] not in ('', 'ok') for row in results[1:])
@@ -0,0 +1,77 @@
+import csv
+import io
+from App import jobs
+from App.jobs import JobRunner
+from App.views import BATCH_SYNC_MAX_BYTES
+
+CSV_ROWS = [
+    'compound_A,compound_B,x_A,T,D_exp',
+    'Ethanol,Water,0.3,310,1.2e-9',
+    'Unobtainium,Water,0.3,310,',
+    'Ethanol,Water,1.5,310,',
+    'Ethanol,Water,0.3,,',
+    'Benzene,Toluene,0.5,300,',
+]
+
+def _post(client, text, **form):
+    return client.post('/batch_csv', data={'file': (io.BytesIO(text.encode('utf-8')), 'lot.csv'), **form},
+                       content_type='multipart/form-data')
+
+def _rows(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+def test_invalid_rows_are_reported_individually(client):
+    response = _post(client, '\n'.join(CSV_ROWS) + '\n')
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    assert (response.headers['X-Rows-Ok'], response.headers['X-Rows-Error']) == ('2', '3')
+    rows = {int(row['line']): row for row in _rows(response.get_data(as_text=True))}
+    assert rows[2]['status'] == 'ok' and float(rows[2]['D_calc']) > 0 and rows[2]['error_pct']
+    assert 'Composé inconnu' in rows[3]['status'] and rows[3]['D_calc'] == ''
+    assert 'strictement comprise entre 0 et 1' in rows[4]['status']
+    assert 'Valeur non numérique pour T' in rows[5]['status']
+    assert rows[6]['status'] == 'ok' and rows[6]['error_pct'] == ''
+
+def test_semicolon_csv_without_header_and_translated_names(client):
+    response = _post(client, 'Éthanol;Eau;0,3;310;\nEthanol;Water;0,3;310;\n', lang='fr')
+    rows = _rows(response.get_data(as_text=True))
+    assert [row['status'] for row in rows] == ['ok', 'ok']
+    assert rows[0]['D_calc'] == rows[1]['D_calc']
+
+def test_persist_records_only_valid_rows(app, client, user):
+    from App import db
+    from App.history import history
+    from App.models import Calculation
+    with app.app_context():
+        Calculation.query.filter_by(user_id=user).delete()
+        db.session.commit()
+    _post(client, '\n'.join(CSV_ROWS) + '\n', persist='1')
+    history.flush()
+    with app.app_context():
+        assert Calculation.query.filter_by(user_id=user).count() == 2
+
+def test_missing_file_returns_400(client):
+    assert client.post('/batch_csv', data={}, content_type='multipart/form-data').status_code == 400
+
+def test_large_upload_runs_as_job(client):
+    line = 'Ethanol,Water,0.3,310,1.2e-9\n'
+    count = BATCH_SYNC_MAX_BYTES // len(line) + 100
+    text = CSV_ROWS[0] + '\n' + line * count + 'Ethanol,Water,2,310,\n'
+    response = _post(client, text)
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    # JOB_WORKERS=0 en test : la tâche est exécutée ici#
+    runner = JobRunner()
+    runner._app = client.application
+    conn = jobs._connect()
+    try:
+        row = runner._claim(conn)
+        assert row['id'] == job_id
+        runner._run(row, conn)
+    finally:
+        conn.close()
+    status = client.get(f"/jobs/{job_id}").get_json()
+    assert status['status'] == 'done', status
+    rows = _rows(client.get(status['download_url']).get_data(as_text=True))
+    assert len(rows) == count + 1
+    assert sum(row['status'] == 'ok' for row in rows) == count
+    assert 'strictement comprise entre 0 et 1' in rows[-1]['status']
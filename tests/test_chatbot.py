@@ -0,0 +1,55 @@
+import os
+import pytest
+from App import chatbot_bot
+from App.chatbot_index import ChatIndex
+
+def _publish(base_dir, version, answer, langs=None):
+    # Version minimale : index de chaque langue et pointeur CURRENT remplacé atomiquement#
+    version_dir = os.path.join(base_dir, version)
+    os.makedirs(version_dir)
+    for lang in langs or chatbot_bot.CHATBOT_LANGUAGES:
+        ChatIndex.build([("Bonjour", answer)]).save(os.path.join(version_dir, f"index_{lang}.npz"))
+    with open(os.path.join(base_dir, 'CURRENT.tmp'), 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(os.path.join(base_dir, 'CURRENT.tmp'), os.path.join(base_dir, 'CURRENT'))
+
+@pytest.fixture
+def chatbot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chatbot_bot, 'CHATBOT_DIR', str(tmp_path))
+    return str(tmp_path)
+
+def test_new_version_is_used_without_restart(chatbot_dir):
+    _publish(chatbot_dir, 'v1', "Réponse v1")
+    assert chatbot_bot.answer_message("Bonjour", 'fr') == "Réponse v1"
+    _publish(chatbot_dir, 'v2', "Réponse v2")
+    assert chatbot_bot.answer_message("Bonjour", 'fr') == "Réponse v2"
+
+def test_version_without_language_index_falls_back_to_bot(chatbot_dir, monkeypatch):
+    class StubBot:
+        def get_response(self, msg):
+            return "Réponse ChatterBot"
+    monkeypatch.setattr(chatbot_bot, 'get_bot', lambda: StubBot())
+    _publish(chatbot_dir, 'v1', "Réponse v1")
+    assert chatbot_bot.answer_message("Bonjour", 'fr') == "Réponse v1"
+    _publish(chatbot_dir, 'v2', "Réponse v2", langs=['en'])
+    assert chatbot_bot.answer_message("Bonjour", 'fr') == "Réponse ChatterBot"
+    assert chatbot_bot.answer_message("Bonjour", 'en') == "Réponse v2"
+
+def test_cached_answers_are_keyed_on_version(chatbot_dir, monkeypatch):
+    _publish(chatbot_dir, 'v1', "Réponse v1")
+    assert chatbot_bot.answer_message("Bonjour", 'fr') == "Réponse v1"
+    _publish(chatbot_dir, 'v2', "Réponse v2")
+    # Même sans vidage du cache, la clé de la nouvelle version ne retrouve pas l'ancienne réponse#
+    monkeypatch.setattr(chatbot_bot._indexed_answer, 'cache_clear', lambda: None)
+    assert chatbot_bot.answer_message("Bonjour", 'fr') == "Réponse v2"
+
+def test_chatbot_events_are_exposed_on_metrics(app, chatbot_dir):
+    _publish(chatbot_dir, 'v1', "Réponse v1")
+    client = app.test_client()
+    response = client.post('/api/chatbot', json={'message': "Bonjour", 'lang': 'fr'})
+    assert response.get_json() == {'response': "Réponse v1"}
+    text = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE calcdiff_chatbot_events_total counter' in text
+    assert 'calcdiff_chatbot_events_total{event="request"}' in text
+    assert 'calcdiff_chatbot_queue_depth' in text
+    assert client.get('/api/chatbot/metrics').status_code in (404, 405)
@@ -0,0 +1,40 @@
+import json
+import pytest
+
+SWEEP = {'compound_A': 'Ethanol', 'compound_B': 'Water', 'T': 310}
+
+@pytest.mark.parametrize('payload', [
+    {**SWEEP, 'T': None},
+    {**SWEEP, 'T': 'nan'},
+    {**SWEEP, 'T': 'inf'},
+    {**SWEEP, 'x': [0.2, 'nan']},
+    {**SWEEP, 'x': [0.2, {'a': 1}]},
+    {**SWEEP, 'compound_A': ['Ethanol']},
+    {**SWEEP, 'compound_B': {'name': 'Water'}},
+    {**SWEEP, 'x_min': None},
+    {'compound_A': 'Ethanol', 'T': 310},
+    {**SWEEP, 'format': 'xml'},
+    {**SWEEP, 'format': ['json']},
+    [1, 2],
+    'Ethanol',
+    3,
+])
+def test_invalid_sweep_returns_400(client, payload):
+    response = client.post('/diffusion_sweep', json=payload)
+    assert response.status_code == 400
+    assert 'error' in json.loads(response.get_data(as_text=True))
+
+def test_scalar_x_is_accepted(client):
+    response = client.post('/diffusion_sweep', json={**SWEEP, 'x': 0.5})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['x_A'] == [0.5] and len(body['D_AB']) == 1
+
+def test_unknown_format_in_query_string_returns_400(client):
+    response = client.get('/diffusion_sweep', query_string={**SWEEP, 'format': 'xml'})
+    assert response.status_code == 400
+
+def test_ndjson_format_is_served(client):
+    response = client.post('/diffusion_sweep', json={**SWEEP, 'x': [0.2, 0.5], 'format': 'ndjson'})
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    assert len(response.get_data(as_text=True).splitlines()) == 3
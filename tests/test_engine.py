@@ -0,0 +1,54 @@
+import itertools
+import math
+import numpy as np
+import pytest
+from App import unifac_diffusion as engine
+from App.unifac_params import get_store
+
+# Paires de composés fournis avec l'application (liste lue dans la base de paramètres)#
+PAIRS = list(itertools.combinations(get_store().compound_names, 2))
+X1 = np.linspace(0.01, 0.99, 9)
+TEMPERATURES = np.array([260.0, 298.15, 313.0, 350.0, 420.0])
+RTOL = 1e-12
+
+def _scalar_reference(comp1, comp2, x1, T):
+    """ lnγ1, lnγ2 et D calculés point par point avec le moteur scalaire d'origine """
+    groups1, groups2 = get_store().compound_groups(comp1), get_store().compound_groups(comp2)
+    ln_g1, ln_g2 = engine.compute_comb_and_res(x1, 1 - x1, groups1, groups2, T)
+    return ln_g1, ln_g2, math.exp((1 - x1) * ln_g1 + x1 * ln_g2) * 1e-6
+
+@pytest.fixture(autouse=True)
+def exact_engine(monkeypatch):
+    # Calcul exact de τ et pas de cache partagé : on compare les moteurs eux-mêmes#
+    monkeypatch.setattr(engine, '_tau_grid', None)
+    monkeypatch.setattr(engine, 'get_result_cache', lambda: None)
+
+@pytest.mark.parametrize('comp1, comp2', PAIRS)
+def test_batch_matches_scalar_engine(comp1, comp2):
+    x1, T = np.meshgrid(X1, TEMPERATURES)
+    ln_g1, ln_g2, D = engine.unifac_diffusion_batch(comp1, comp2, x1, T)
+    expected = np.array([_scalar_reference(comp1, comp2, x, t) for x, t in zip(x1.ravel(), T.ravel())])
+    np.testing.assert_allclose(ln_g1.ravel(), expected[:, 0], rtol=RTOL, atol=RTOL)
+    np.testing.assert_allclose(ln_g2.ravel(), expected[:, 1], rtol=RTOL, atol=RTOL)
+    np.testing.assert_allclose(D.ravel(), expected[:, 2], rtol=RTOL)
+
+@pytest.mark.parametrize('comp1, comp2', PAIRS)
+def test_uniform_and_scalar_temperature_match_scalar_engine(comp1, comp2):
+    # τ mis en cache (T scalaire ou tableau uniforme) et τ vectorisé donnent le même résultat#
+    for T in (298.15, np.full(X1.shape, 298.15)):
+        _, _, D = engine.unifac_diffusion_batch(comp1, comp2, X1, T)
+        expected = [_scalar_reference(comp1, comp2, x, 298.15)[2] for x in X1]
+        np.testing.assert_allclose(D, expected, rtol=RTOL)
+
+@pytest.mark.parametrize('comp1, comp2', PAIRS)
+def test_unifac_diffusion_wraps_batch_engine(comp1, comp2):
+    for x1, T in itertools.product((0.1, 0.5, 0.9), (280.0, 330.0)):
+        D, error_pct = engine.unifac_diffusion(comp1, comp2, x1, T)
+        assert isinstance(D, float) and error_pct is None
+        assert D == pytest.approx(_scalar_reference(comp1, comp2, x1, T)[2], rel=RTOL)
+
+@pytest.mark.parametrize('x1, T', [(0.0, 300.0), (1.0, 300.0), (0.5, 0.0), (float('nan'), 300.0), (0.5, float('inf'))])
+def test_batch_rejects_points_outside_domain(x1, T):
+    comp1, comp2 = PAIRS[0]
+    with pytest.raises(ValueError):
+        engine.unifac_diffusion_batch(comp1, comp2, np.array([0.5, x1]), np.array([300.0, T]))
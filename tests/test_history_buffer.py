@@ -0,0 +1,32 @@
+from App import history as history_module
+from App.history import HistoryBuffer
+
+ROW = dict(user_id=1, compound_A='Ethanol', compound_B='Water', x_A=0.3, T=310.0, D_exp=None, D_calc=1e-9, error=None)
+
+def test_buffer_stays_bounded_when_database_fails(app, monkeypatch):
+    from App import db
+    monkeypatch.setattr(history_module, 'HISTORY_MAX_PENDING', 50)
+    monkeypatch.setattr(history_module, 'HISTORY_FLUSH_SIZE', 10 ** 6)
+    def failing_execute(*args, **kwargs):
+        raise RuntimeError("base indisponible")
+    monkeypatch.setattr(db.session, 'execute', failing_execute)
+    buffer = HistoryBuffer()
+    buffer.init_app(app)
+    buffer.record_many([ROW] * 30)
+    buffer.record_many([{**ROW, 'user_id': 2}] * 30)
+    buffer.record_many([{**ROW, 'user_id': 3}] * 30)
+    assert len(buffer._pending) <= 50
+    # Les lignes les plus récentes sont conservées#
+    assert buffer._pending[-1]['user_id'] == 3
+
+def test_full_buffer_is_written_synchronously(app, user, monkeypatch):
+    from App import db
+    from App.models import Calculation
+    monkeypatch.setattr(history_module, 'HISTORY_MAX_PENDING', 20)
+    monkeypatch.setattr(history_module, 'HISTORY_FLUSH_SIZE', 10 ** 6)
+    buffer = HistoryBuffer()
+    buffer.init_app(app)
+    buffer.record_many([{**ROW, 'user_id': user}] * 20)
+    assert buffer._pending == []
+    with app.app_context():
+        assert db.session.query(Calculation).filter_by(user_id=user).count() >= 20
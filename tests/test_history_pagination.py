@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+import pytest
+
+ROW = dict(compound_A='Ethanol', compound_B='Water', x_A=0.3, T=310.0, D_exp=None, D_calc=1e-9, error=None)
+
+@pytest.fixture
+def calculations(app, user):
+    """ Insère des calculs pour l'utilisateur de test (timestamps donnés, None autorisé) """
+    from App import db
+    from App.models import Calculation
+    with app.app_context():
+        Calculation.query.filter_by(user_id=user).delete()
+        db.session.commit()
+    def insert(timestamps):
+        with app.app_context():
+            db.session.execute(Calculation.__table__.insert(), [{**ROW, 'user_id': user, 'timestamp': ts} for ts in timestamps])
+            db.session.commit()
+    return insert
+
+def _all_pages(client, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/calculs_history.json', query_string={'limit': limit, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        ids += [calc['id'] for calc in body['calculations']]
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids, pages
+
+def test_pages_with_identical_timestamps_have_no_gaps(client, calculations):
+    calculations([datetime(2024, 1, 1)] * 120)
+    ids, pages = _all_pages(client, 25)
+    assert pages == 5
+    assert len(ids) == len(set(ids)) == 120
+    assert ids == sorted(ids, reverse=True)
+
+def test_null_timestamps_are_paged_last(client, calculations):
+    start = datetime(2024, 1, 1)
+    calculations([start + timedelta(days=k % 3) for k in range(10)] + [None] * 7)
+    response = client.get('/calculs_history.json', query_string={'limit': 100})
+    expected = [calc['id'] for calc in response.get_json()['calculations']]
+    assert [calc['timestamp'] for calc in response.get_json()['calculations']][-7:] == [None] * 7
+    for limit in (1, 4, 9):
+        ids, _ = _all_pages(client, limit)
+        assert ids == expected
+
+def test_invalid_cursor_returns_first_page(client, calculations):
+    calculations([datetime(2024, 1, 1)] * 3)
+    response = client.get('/calculs_history.json', query_string={'cursor': 'pas-un-curseur'})
+    assert response.status_code == 200
+    assert len(response.get_json()['calculations']) == 3
+
+def test_init_db_creates_missing_indexes(app):
+    from App import db
+    with app.app_context():
+        db.session.execute(db.text("DROP INDEX IF EXISTS ix_calculation_user_id_timestamp"))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert 'ix_calculation_user_id_timestamp' in {index['name'] for index in db.inspect(db.engine).get_indexes('calculation')}
@@ -0,0 +1,119 @@
+import threading
+import time
+import pytest
+from App import jobs
+from App.jobs import JobRunner, job_handler, submit_job, get_job, cancel_job
+
+# Handlers de test : l'un attend sans signaler de progression, l'autre signale en boucle#
+_release = threading.Event()
+
+@job_handler('tests.block')
+def _block_job(job, params):
+    _release.wait(10)
+    with open(job.output_path('out.txt'), 'w') as f:
+        f.write('ok')
+    return 'out.txt', 'text/plain'
+
+@job_handler('tests.progress')
+def _progress_job(job, params):
+    for _ in range(500):
+        job.progress(0.5, 'en cours')
+        time.sleep(0.01)
+    return 'out.txt', 'text/plain'
+
+@pytest.fixture
+def runner(app, tmp_path, monkeypatch):
+    """ File de tâches isolée et runner sans thread (les tâches sont réservées à la main) """
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path))
+    _release.clear()
+    runner = JobRunner()
+    runner._app = app
+    yield runner
+    _release.set()
+
+def _claim(runner):
+    conn = jobs._connect()
+    try:
+        return runner._claim(conn)
+    finally:
+        conn.close()
+
+def _run_in_thread(runner):
+    def run():
+        conn = jobs._connect()
+        try:
+            runner._run(runner._claim(conn), conn)
+        finally:
+            conn.close()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def _make_stale(job_id):
+    conn = jobs._connect()
+    try:
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 2 * jobs.JOB_STALE_SECONDS, job_id))
+    finally:
+        conn.close()
+
+def test_stale_job_is_requeued(runner):
+    job_id = submit_job('tests.block', 1)
+    assert _claim(runner)['attempts'] == 1
+    assert _claim(runner) is None
+    _make_stale(job_id)
+    row = _claim(runner)
+    assert row['id'] == job_id and row['attempts'] == 2 and row['status'] == 'running'
+
+def test_job_is_failed_after_max_attempts(runner, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 2)
+    job_id = submit_job('tests.block', 1)
+    for _ in range(2):
+        assert _claim(runner)['id'] == job_id
+        _make_stale(job_id)
+    assert _claim(runner) is None
+    job = get_job(job_id)
+    assert job['status'] == 'failed' and job['attempts'] == 2 and 'tentatives' in job['error']
+
+def test_heartbeat_keeps_long_job_claimed(runner, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_HEARTBEAT_SECONDS', 0.05)
+    monkeypatch.setattr(jobs, 'JOB_STALE_SECONDS', 0.5)
+    job_id = submit_job('tests.block', 1)
+    thread = _run_in_thread(runner)
+    time.sleep(1.0)
+    assert _claim(runner) is None
+    _release.set()
+    thread.join(5)
+    job = get_job(job_id)
+    assert job['status'] == 'done' and job['attempts'] == 1
+
+def test_cancel_queued_job(runner):
+    job_id = submit_job('tests.block', 1)
+    cancel_job(job_id)
+    assert get_job(job_id)['status'] == 'cancelled'
+    assert _claim(runner) is None
+
+def test_cancel_running_job(runner):
+    job_id = submit_job('tests.progress', 1)
+    thread = _run_in_thread(runner)
+    deadline = time.time() + 5
+    while get_job(job_id)['status'] != 'running' and time.time() < deadline:
+        time.sleep(0.01)
+    cancel_job(job_id)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert get_job(job_id)['status'] == 'cancelled'
+
+def test_late_result_of_requeued_run_is_ignored(runner, monkeypatch):
+    # Une exécution reprise par un autre runner : la fin de la première ne l'écrase pas#
+    job_id = submit_job('tests.block', 1)
+    thread = _run_in_thread(runner)
+    deadline = time.time() + 5
+    while get_job(job_id)['status'] != 'running' and time.time() < deadline:
+        time.sleep(0.01)
+    _make_stale(job_id)
+    time.sleep(0.01)
+    assert _claim(runner)['attempts'] == 2
+    _release.set()
+    thread.join(5)
+    job = get_job(job_id)
+    assert job['status'] == 'running' and job['attempts'] == 2
@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from conftest import TEST_ENV, USER_EMAIL
+
+# Une tentative de connexion erronée dans un processus neuf (comme un autre worker gunicorn)#
+FAILED_LOGIN = """
+from App import create_app
+app = create_app()
+response = app.test_client().post('/login_fr', data={'email': %r, 'password': 'mauvais'})
+assert response.status_code == 302, response.status_code
+""" % USER_EMAIL
+
+def _failed_login_in_new_process():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', FAILED_LOGIN], cwd=root, env={**os.environ, **TEST_ENV}, check=True)
+
+def test_lockout_counts_failures_across_processes(app, user):
+    from App import db
+    from App.models import Formulaire
+    from App.security import LOGIN_MAX_FAILURES, login_throttle
+    for attempt in range(1, LOGIN_MAX_FAILURES):
+        _failed_login_in_new_process()
+        assert login_throttle.failures(USER_EMAIL) == attempt
+        with app.app_context():
+            row = db.session.get(Formulaire, user)
+            # Les échecs ne sont pas écrits en base tant que le compte n'est pas bloqué#
+            assert not row.failed_attempts
+            assert row.lockout_time is None
+    _failed_login_in_new_process()
+    assert login_throttle.failures(USER_EMAIL) == 0
+    with app.app_context():
+        row = db.session.get(Formulaire, user)
+        assert row.lockout_time is not None
+        assert row.lockout_level == 1
+
+def test_successful_login_resets_failures(app, user):
+    from App.security import login_throttle
+    from conftest import USER_PASSWORD
+    client = app.test_client()
+    client.post('/login_fr', data={'email': USER_EMAIL, 'password': 'mauvais'})
+    assert login_throttle.failures(USER_EMAIL) == 1
+    response = client.post('/login_fr', data={'email': USER_EMAIL, 'password': USER_PASSWORD})
+    assert response.status_code == 302 and 'dashboard_fr' in response.headers['Location']
+    assert login_throttle.failures(USER_EMAIL) == 0
+
+def test_throttle_buckets_are_shared_between_processes(tmp_path):
+    from App.security import LoginThrottle, LOGIN_EMAIL_BURST
+    path = str(tmp_path / 'throttle.sqlite3')
+    first, second = LoginThrottle(path), LoginThrottle(path)
+    allowed = [(first if k % 2 else second).allow(USER_EMAIL, f"10.0.0.{k}") for k in range(LOGIN_EMAIL_BURST + 1)]
+    assert allowed == [True] * LOGIN_EMAIL_BURST + [False]
+
+def test_only_one_concurrent_failure_starts_the_lockout(tmp_path):
+    from App.security import LoginThrottle, LOGIN_MAX_FAILURES
+    path = str(tmp_path / 'throttle.sqlite3')
+    first, second = LoginThrottle(path), LoginThrottle(path)
+    reached = [(first if k % 2 else second).record_failure(USER_EMAIL) for k in range(2 * LOGIN_MAX_FAILURES)]
+    assert reached == ([False] * (LOGIN_MAX_FAILURES - 1) + [True]) * 2
+
+def test_token_endpoint_respects_lockout(app, user):
+    from datetime import datetime, timedelta
+    from App import db
+    from App.models import Formulaire
+    from conftest import USER_PASSWORD
+    with app.app_context():
+        db.session.get(Formulaire, user).lockout_time = datetime.utcnow() + timedelta(minutes=10)
+        db.session.commit()
+    response = app.test_client().post('/api/v1/tokens', json={'email': USER_EMAIL, 'password': USER_PASSWORD})
+    assert response.status_code == 429
+    assert 'token' not in response.get_json()
+
+def test_token_endpoint_counts_failures(app, user):
+    from App import db
+    from App.models import Formulaire
+    from App.security import LOGIN_MAX_FAILURES, login_throttle
+    client = app.test_client()
+    for attempt in range(1, LOGIN_MAX_FAILURES):
+        assert client.post('/api/v1/tokens', json={'email': USER_EMAIL, 'password': 'mauvais'}).status_code == 401
+        assert login_throttle.failures(USER_EMAIL) == attempt
+    assert client.post('/api/v1/tokens', json={'email': USER_EMAIL, 'password': 'mauvais'}).status_code == 429
+    with app.app_context():
+        assert db.session.get(Formulaire, user).lockout_level == 1
+
+def test_unknown_emails_are_rate_limited_by_ip(app, user):
+    from App.security import LOGIN_IP_BURST
+    client = app.test_client()
+    codes = [client.post('/api/v1/tokens', json={'email': f"inconnu{k}@example.com", 'password': 'x'}).status_code
+             for k in range(LOGIN_IP_BURST + 1)]
+    assert codes == [401] * LOGIN_IP_BURST + [429]
+    response = client.post('/login_fr', data={'email': 'autre@example.com', 'password': 'x'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert any('Trop de tentatives' in message for _, message in session.get('_flashes', []))
+
+def test_full_hash_pool_fails_fast(monkeypatch):
+    from App import security
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(security, 'HASH_WORKERS', 1)
+    monkeypatch.setattr(security, '_get_pool', lambda: None)
+    monkeypatch.setattr(security, '_slots', slots)
+    started = time.perf_counter()
+    with pytest.raises(security.HashingBusy):
+        security.verify_password('pbkdf2:sha256:1$sel$hash', 'x')
+    assert time.perf_counter() - started < 0.5
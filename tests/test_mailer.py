@@ -0,0 +1,64 @@
+import pytest
+from flask_mail import Message
+from App import mailer as mailer_module
+from App.mailer import MailDispatcher
+
+@pytest.fixture
+def dispatcher(app, monkeypatch):
+    """ File d'envoi sans thread : les envois se font uniquement via flush() """
+    dispatcher = MailDispatcher()
+    monkeypatch.setattr(dispatcher, '_ensure_thread', lambda: None)
+    dispatcher.init_app(app)
+    return dispatcher
+
+def _message(recipient, subject='Test'):
+    msg = Message(subject=subject, sender='noreply@example.com', recipients=[recipient])
+    msg.body = 'Bonjour'
+    return msg
+
+def test_batch_is_sent_over_one_connection(dispatcher, smtp_server):
+    for k in range(3):
+        dispatcher.send(_message(f"user{k}@example.com", subject=f"Message {k}"))
+    assert smtp_server.messages == []
+    assert dispatcher.flush() == 3
+    assert [rcpt for _, rcpt, _ in smtp_server.messages] == [[f"user{k}@example.com"] for k in range(3)]
+    assert len({peer for peer, _, _ in smtp_server.messages}) == 1
+    assert 'Subject: Message 2' in smtp_server.messages[2][2]
+
+def test_batches_are_capped(dispatcher, smtp_server, monkeypatch):
+    monkeypatch.setattr(mailer_module, 'MAIL_BATCH_SIZE', 2)
+    for k in range(5):
+        dispatcher.send(_message(f"user{k}@example.com"))
+    assert dispatcher.flush() == 5
+    assert len({peer for peer, _, _ in smtp_server.messages}) == 3
+
+def test_unreachable_server_is_retried(dispatcher, smtp_server):
+    smtp_server.stop()
+    dispatcher.send(_message('user@example.com'))
+    assert dispatcher.flush() == 0
+    assert dispatcher._pending[0][1] == 1
+    smtp_server.start()
+    assert dispatcher.flush() == 1
+    assert dispatcher._pending == []
+    assert [rcpt for _, rcpt, _ in smtp_server.messages] == [['user@example.com']]
+
+def test_refused_recipient_does_not_block_batch(dispatcher, smtp_server, monkeypatch):
+    monkeypatch.setattr(mailer_module, 'MAIL_MAX_ATTEMPTS', 2)
+    smtp_server.refused.add('refused@example.com')
+    dispatcher.send(_message('refused@example.com'))
+    dispatcher.send(_message('user@example.com'))
+    assert dispatcher.flush() == 1
+    assert [rcpt for _, rcpt, _ in smtp_server.messages] == [['user@example.com']]
+    assert [item[1] for item in dispatcher._pending] == [1]
+    # Deuxième refus : MAIL_MAX_ATTEMPTS atteint, le message est abandonné#
+    assert dispatcher.flush() == 0
+    assert dispatcher._pending == []
+
+def test_confirmation_html_is_rendered_once_per_locale(app, dispatcher, monkeypatch):
+    renders = []
+    monkeypatch.setattr(mailer_module, 'render_template', lambda *args, **kwargs: renders.append(kwargs) or f"<p>{kwargs['code']}</p>")
+    with app.app_context():
+        assert dispatcher.confirmation_html('123456', 'fr') == '<p>123456</p>'
+        assert dispatcher.confirmation_html('<b>', 'fr') == '<p>&lt;b&gt;</p>'
+        dispatcher.confirmation_html('654321', 'en')
+    assert [kwargs['lang'] for kwargs in renders] == ['fr', 'en']
@@ -0,0 +1,47 @@
+import json
+import os
+import time
+from App import metrics
+
+def _series_count(name, labels):
+    values = dict(((n, l), v) for n, l, v in ([n, tuple(map(tuple, l)), v] for n, l, v in metrics.registry.snapshot()['series']))
+    return sum(values.get((name, labels), [0])[:-1])
+
+def test_queries_counted_once_after_several_create_app(app):
+    from App import create_app, db
+    create_app()
+    create_app()
+    labels = (('span', 'db_query'),)
+    with app.app_context():
+        before = _series_count(metrics.SPAN_METRIC, labels)
+        db.session.execute(db.text("SELECT 1"))
+        assert _series_count(metrics.SPAN_METRIC, labels) == before + 1
+
+def _count_in_text(text, line_prefix):
+    return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(line_prefix))
+
+def test_expired_worker_files_are_folded_not_lost(app):
+    name = 'metrics-999999-1.json'
+    path = os.path.join(metrics.METRICS_DIR, name)
+    os.makedirs(metrics.METRICS_DIR, exist_ok=True)
+    values = [0] * (len(metrics.BUCKETS) + 1) + [0.0]
+    values[0], values[-1] = 7, 0.001
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'pid': 999999, 'time': 0, 'series': [[metrics.SPAN_METRIC, [['span', 'dead_worker']], values]], 'gauges': {}}, f)
+    prefix = f'{metrics.SPAN_METRIC}_count{{span="dead_worker"}}'
+    before = _count_in_text(metrics.render_prometheus(), prefix)
+    old = time.time() - metrics.METRICS_RETENTION_SECONDS - 10
+    os.utime(path, (old, old))
+    after = _count_in_text(metrics.render_prometheus(), prefix)
+    assert not os.path.exists(path)
+    assert after == before
+    assert _count_in_text(metrics.render_prometheus(), prefix) == before
+
+def test_endpoint_denied_by_default_outside_debug(app, monkeypatch):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 200
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    assert client.get('/metrics').status_code == 403
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -0,0 +1,55 @@
+import itertools
+import numpy as np
+import pytest
+from App import unifac_diffusion as engine
+from App.unifac_params import ParameterStore, compile_csv, get_store
+
+COMPOUNDS = get_store().compound_names
+PAIRS = list(itertools.combinations(COMPOUNDS, 2))
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory):
+    """ Base compilée depuis les CSV et la même base relue depuis le .npz """
+    path = str(tmp_path_factory.mktemp('params') / 'unifac_params.npz')
+    from_csv = ParameterStore(compile_csv())
+    from_csv.save(path)
+    return from_csv, ParameterStore.load(path)
+
+def test_npz_arrays_match_csv(stores):
+    from_csv, from_npz = stores
+    assert sorted(from_npz.arrays) == sorted(from_csv.arrays)
+    for name, arr in from_csv.arrays.items():
+        assert from_npz.arrays[name].dtype == arr.dtype, name
+        np.testing.assert_array_equal(from_npz.arrays[name], arr, err_msg=name)
+    assert from_npz.fingerprint == from_csv.fingerprint
+
+@pytest.mark.parametrize('compound', COMPOUNDS)
+def test_npz_compound_parameters_match_csv(stores, compound):
+    from_csv, from_npz = stores
+    groups = from_csv.compound_groups(compound)
+    assert from_npz.compound_groups(compound) == groups
+    for gi, gj in itertools.product(groups, repeat=2):
+        assert from_npz.aij(gi, gj) == from_csv.aij(gi, gj)
+
+@pytest.mark.parametrize('comp1, comp2', PAIRS)
+def test_binary_activity_matches_binary_engine(comp1, comp2):
+    x1, T = np.meshgrid(np.linspace(0.05, 0.95, 7), [280.0, 320.0, 390.0])
+    ln_g = engine.unifac_activity([comp1, comp2], np.stack([x1, 1 - x1], axis=-1), T)
+    ln_g1, ln_g2 = engine.compute_comb_and_res_batch(x1, get_store().compound_groups(comp1), get_store().compound_groups(comp2), T)
+    np.testing.assert_array_equal(ln_g[..., 0], ln_g1)
+    np.testing.assert_array_equal(ln_g[..., 1], ln_g2)
+
+@pytest.mark.parametrize('names', list(itertools.combinations(COMPOUNDS, 3)))
+def test_ternary_activity_is_permutation_invariant(names):
+    x = np.array([[0.2, 0.3, 0.5], [0.6, 0.3, 0.1]])
+    ln_g = engine.unifac_activity(list(names), x, 310.0)
+    order = [2, 0, 1]
+    ln_g_permuted = engine.unifac_activity([names[k] for k in order], x[:, order], 310.0)
+    np.testing.assert_allclose(ln_g_permuted, ln_g[:, order], rtol=1e-12, atol=1e-12)
+
+def test_legacy_views_are_built_once_per_store():
+    store = get_store()
+    assert engine.interactions is engine.interactions
+    assert engine.compounds is engine.compounds
+    assert engine.interactions == {(gi, gj): store.aij(gi, gj) for gi in store.group_names for gj in store.group_names if store.aij(gi, gj)}
+    assert engine.compounds[COMPOUNDS[0]]['groups'] == store.compound_groups(COMPOUNDS[0])
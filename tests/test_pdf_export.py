@@ -0,0 +1,66 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+
+def _add_calculations(app, user_id, count):
+    from App import db
+    from App.models import Calculation
+    with app.app_context():
+        start = datetime(2024, 1, 1)
+        db.session.execute(Calculation.__table__.insert(), [
+            {'user_id': user_id, 'compound_A': 'Ethanol', 'compound_B': 'Water', 'x_A': 0.3, 'T': 310.0,
+             'D_exp': 1.2e-9, 'D_calc': 1.1e-9, 'error': 0.08, 'timestamp': start + timedelta(minutes=k)}
+            for k in range(count)])
+        db.session.commit()
+
+def _export(app, user_id, **args):
+    from App.pdf_export import parse_export_params, export_to_cache
+    with app.test_request_context():
+        return export_to_cache(user_id, parse_export_params({'renderer': 'reportlab', **args}))
+
+def test_new_version_replaces_previous_file(app, user):
+    pytest.importorskip('reportlab')
+    _add_calculations(app, user, 3)
+    first = _export(app, user)
+    _add_calculations(app, user, 1)
+    second = _export(app, user)
+    assert first != second
+    assert os.path.exists(second) and not os.path.exists(first)
+    other = _export(app, user, limit='2')
+    assert os.path.exists(other) and os.path.exists(second)
+
+def test_cache_is_capped_by_size(app, user, monkeypatch):
+    pytest.importorskip('reportlab')
+    from App import pdf_export
+    _add_calculations(app, user, 3)
+    paths = [_export(app, user, limit=str(k)) for k in range(1, 4)]
+    monkeypatch.setattr(pdf_export, 'PDF_CACHE_MAX_BYTES', os.path.getsize(paths[-1]))
+    newest = _export(app, user, limit='5')
+    assert os.path.exists(newest)
+    assert not any(os.path.exists(path) for path in paths)
+
+def test_weasyprint_chunks_are_merged(app, user, monkeypatch, tmp_path):
+    pytest.importorskip('weasyprint')
+    pypdf = pytest.importorskip('pypdf')
+    from App import pdf_export
+    _add_calculations(app, user, 25)
+    monkeypatch.setattr(pdf_export, 'PDF_CHUNK_ROWS', 10)
+    with app.test_request_context():
+        path = pdf_export.render_pdf(user, pdf_export.parse_export_params({}), str(tmp_path / 'h.pdf'))
+    assert len(pypdf.PdfReader(path).pages) >= 3
+    assert os.listdir(tmp_path) == ['h.pdf']
+
+def test_concurrent_renders_of_same_export_do_not_collide(app, user, tmp_path):
+    pytest.importorskip('reportlab')
+    from concurrent.futures import ThreadPoolExecutor
+    from App import pdf_export
+    _add_calculations(app, user, 50)
+    path = str(tmp_path / 'h.pdf')
+    def render(_):
+        with app.test_request_context():
+            return pdf_export.render_pdf(user, pdf_export.parse_export_params({'renderer': 'reportlab'}), path)
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(render, range(4))) == [path] * 4
+    assert os.listdir(tmp_path) == ['h.pdf']
+    with open(path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
@@ -0,0 +1,44 @@
+import sqlite3
+import time
+import pytest
+from App import result_cache, unifac_diffusion as engine
+from App.result_cache import ResultCache
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / 'results.sqlite3'))
+    monkeypatch.setattr(result_cache, '_cache', cache)
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_ENABLED', True)
+    yield cache
+    engine.disable_tau_grid()
+
+def test_grid_and_exact_results_do_not_share_entries(cache):
+    engine.enable_tau_grid(250.0, 600.0, 11)
+    D_grid, _ = engine.unifac_diffusion('Ethanol', 'Water', 0.3, 313.7)
+    engine.disable_tau_grid()
+    D_exact, _ = engine.unifac_diffusion('Ethanol', 'Water', 0.3, 313.7)
+    _, _, D_reference = engine.unifac_diffusion_batch('Ethanol', 'Water', 0.3, 313.7)
+    assert D_exact == float(D_reference)
+    assert D_grid != D_exact
+    assert cache.entries() == 2
+
+def test_locked_database_does_not_block(cache):
+    key = cache.key('f', 'exact', 'Ethanol', 'Water', 0.3, 310.0)
+    cache.put(key, 1.0)
+    blocker = sqlite3.connect(cache.path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        start = time.perf_counter()
+        cache.put(cache.key('f', 'exact', 'Ethanol', 'Water', 0.4, 310.0), 2.0)
+        assert time.perf_counter() - start < 0.05
+    finally:
+        blocker.execute("ROLLBACK")
+
+def test_cache_gauges_are_published(cache):
+    from App import metrics
+    engine.unifac_diffusion('Ethanol', 'Water', 0.25, 300.0)
+    engine.unifac_diffusion('Ethanol', 'Water', 0.25, 300.0)
+    text = metrics.render_prometheus()
+    assert 'calcdiff_unifac_result_cache_hits ' in text
+    assert 'calcdiff_unifac_result_cache_misses ' in text
+    assert 'calcdiff_unifac_result_cache_entries 1.0' in text